@@ -0,0 +1,41 @@
+import importlib
+
+# Optional game subsystems; each module exposes a Flask blueprint as `bp`.
+# Modules are imported only when the subsystem is enabled, so a disabled
+# subsystem costs neither its routes nor its static data.
+SUBSYSTEMS = {
+    'tavern': 'blueprints.tavern',
+    'gambling': 'blueprints.gambling',
+    'dungeons': 'blueprints.dungeons',
+    'guilds': 'blueprints.guilds',
+    'garden': 'blueprints.garden',
+    'blacksmith': 'blueprints.blacksmith',
+    'marketplace': 'blueprints.marketplace',
+}
+
+
+def parse_subsystem_list(value):
+    """Parse "gambling, guilds" style config values into a set of subsystem names"""
+    if not value:
+        return set()
+    if isinstance(value, str):
+        value = value.split(',')
+    names = {str(name).strip().lower() for name in value if str(name).strip()}
+    unknown = names - set(SUBSYSTEMS)
+    if unknown:
+        raise ValueError(f"Unknown subsystem(s): {', '.join(sorted(unknown))}")
+    return names
+
+
+def register_subsystems(app):
+    """Import and register blueprints of all subsystems not listed in DISABLED_SUBSYSTEMS"""
+    disabled = parse_subsystem_list(app.config.get('DISABLED_SUBSYSTEMS'))
+    enabled = []
+    for name, module_path in SUBSYSTEMS.items():
+        if name in disabled:
+            continue
+        module = importlib.import_module(module_path)
+        app.register_blueprint(module.bp)
+        enabled.append(name)
+    app.config['ENABLED_SUBSYSTEMS'] = enabled
+    return enabled
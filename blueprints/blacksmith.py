@@ -0,0 +1,304 @@
+from flask import Blueprint, request, jsonify, session
+
+from app import (
+    adjust_item_ownership, close_item_listings, get_db, get_item_definition
+)
+from game_data.blobs import catalog_payload
+
+bp = Blueprint('blacksmith', __name__)
+
+BLACKSMITH_UPGRADE_COSTS = {
+    1: {'metal': 500, 'souls': 50},
+    2: {'metal': 1250, 'souls': 125},
+    3: {'metal': 2500, 'souls': 250},
+    4: {'metal': 5000, 'souls': 500},
+    5: {'metal': 10000, 'souls': 1000}
+}
+
+BLACKSMITH_REFORGE_COST = {'metal': 2500, 'souls': 250, 'gold': 25000}
+
+BLACKSMITH_DISASSEMBLE_RETURN = 0.5  # 50% materials back
+
+BLACKSMITH_MAX_LEVEL = 5
+
+# Materials returned by disassembling, by rarity (+20% per upgrade level)
+BLACKSMITH_RARITY_RETURNS = {
+    'common': {'metal': 100, 'souls': 10},
+    'rare': {'metal': 250, 'souls': 25},
+    'epic': {'metal': 500, 'souls': 50},
+    'legendary': {'metal': 1000, 'souls': 100},
+    'unique': {'metal': 2000, 'souls': 200}
+}
+
+SQL_IN_CHUNK = 500  # stay below SQLite's bound-parameter limit
+
+# ========== BLACKSMITH SYSTEM ==========
+
+@bp.route('/api/blacksmith/materials', methods=['GET'])
+def get_blacksmith_materials():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+    
+    user_id = session['user_id']
+    conn = get_db()
+    c = conn.cursor()
+    
+    c.execute('SELECT metal, souls FROM blacksmith_materials WHERE user_id = ?', (user_id,))
+    materials = c.fetchone()
+    
+    if not materials:
+        c.execute('INSERT INTO blacksmith_materials (user_id, metal, souls) VALUES (?, 0, 0)', (user_id,))
+        conn.commit()
+        metal = 0
+        souls = 0
+    else:
+        metal = materials['metal']
+        souls = materials['souls']
+    
+    conn.close()
+    return jsonify({'success': True, 'metal': metal, 'souls': souls})
+
+def parse_instance_ids(data):
+    """item_ids (or legacy single item_id) -> de-duplicated list of ints, request order kept"""
+    raw_ids = data.get('item_ids') or ([data['item_id']] if data.get('item_id') else [])
+    instance_ids = []
+    for raw_id in raw_ids:
+        try:
+            instance_id = int(raw_id)
+        except (TypeError, ValueError):
+            continue
+        if instance_id not in instance_ids:
+            instance_ids.append(instance_id)
+    return instance_ids
+
+def load_instances(cursor, user_id, instance_ids):
+    """Fetch the user's equipment rows for all instance_ids with IN (...) queries"""
+    rows = {}
+    for start in range(0, len(instance_ids), SQL_IN_CHUNK):
+        chunk = instance_ids[start:start + SQL_IN_CHUNK]
+        placeholders = ','.join('?' * len(chunk))
+        cursor.execute(f'''SELECT id, equipment_id, equipment_slot, upgrade_level
+                           FROM equipment WHERE user_id = ? AND id IN ({placeholders})''',
+                       (user_id, *chunk))
+        for row in cursor.fetchall():
+            rows[row['id']] = row
+    return [rows[instance_id] for instance_id in instance_ids if instance_id in rows]
+
+def plan_upgrades(items, metal, souls):
+    """Greedy plan: cheapest next level first, skip what the remaining budget can't cover.
+    Returns (upgrades, metal_spent, souls_spent)."""
+    candidates = []
+    for order, item in enumerate(items):
+        next_level = (item['upgrade_level'] or 0) + 1
+        cost = BLACKSMITH_UPGRADE_COSTS.get(next_level)
+        if next_level > BLACKSMITH_MAX_LEVEL or not cost:
+            continue
+        candidates.append((cost['metal'], cost['souls'], order, item, next_level))
+    candidates.sort(key=lambda candidate: candidate[:3])
+    
+    upgrades = []
+    metal_spent = 0
+    souls_spent = 0
+    for cost_metal, cost_souls, _, item, next_level in candidates:
+        if metal_spent + cost_metal > metal or souls_spent + cost_souls > souls:
+            continue
+        metal_spent += cost_metal
+        souls_spent += cost_souls
+        upgrades.append((item, next_level))
+    return upgrades, metal_spent, souls_spent
+
+def disassemble_return(rarity, level):
+    base = BLACKSMITH_RARITY_RETURNS.get(rarity, BLACKSMITH_RARITY_RETURNS['common'])
+    level_mult = 1 + (level * 0.2)
+    return int(base['metal'] * level_mult), int(base['souls'] * level_mult)
+
+@bp.route('/api/blacksmith/upgrade', methods=['POST'])
+def blacksmith_upgrade():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+    
+    data = request.get_json() or {}
+    instance_ids = parse_instance_ids(data)
+    if not instance_ids:
+        return jsonify({'success': False, 'error': 'Missing item_id or item_ids'}), 400
+    
+    user_id = session['user_id']
+    conn = get_db()
+    c = conn.cursor()
+    
+    # Get materials (metal and souls)
+    c.execute('SELECT metal, souls FROM blacksmith_materials WHERE user_id = ?', (user_id,))
+    materials = c.fetchone()
+    metal = materials['metal'] if materials else 0
+    souls = materials['souls'] if materials else 0
+    
+    items = load_instances(c, user_id, instance_ids)
+    upgrades, total_metal_spent, total_souls_spent = plan_upgrades(items, metal, souls)
+    
+    if not upgrades:
+        conn.close()
+        return jsonify({'success': False, 'error': 'Nelze upgradovat žádné itemy'}), 400
+    
+    # Debit materials relative to the stored row; a concurrent spend makes this match nothing
+    c.execute('''UPDATE blacksmith_materials SET metal = metal - ?, souls = souls - ?
+                 WHERE user_id = ? AND metal >= ? AND souls >= ?''',
+              (total_metal_spent, total_souls_spent, user_id, total_metal_spent, total_souls_spent))
+    if c.rowcount != 1:
+        conn.rollback()
+        conn.close()
+        return jsonify({'success': False, 'error': 'Nedostatek materiálů'}), 400
+    
+    # Each item only moves up from the level the plan was made for
+    c.executemany('''UPDATE equipment SET upgrade_level = ?
+                     WHERE user_id = ? AND id = ? AND COALESCE(upgrade_level, 0) = ?''',
+                  [(next_level, user_id, item['id'], next_level - 1) for item, next_level in upgrades])
+    if c.rowcount != len(upgrades):
+        conn.rollback()
+        conn.close()
+        return jsonify({'success': False, 'error': 'Item se mezitím změnil, zkus to znovu'}), 409
+    
+    c.execute('SELECT metal, souls FROM blacksmith_materials WHERE user_id = ?', (user_id,))
+    materials = c.fetchone()
+    new_metal = materials['metal']
+    new_souls = materials['souls']
+    
+    conn.commit()
+    conn.close()
+    return jsonify({
+        'success': True,
+        'upgraded': [{
+            'instance_id': item['id'],
+            'equipment_id': item['equipment_id'],
+            'new_level': next_level
+        } for item, next_level in upgrades],
+        'total_metal_spent': total_metal_spent,
+        'total_souls_spent': total_souls_spent,
+        'new_metal': new_metal,
+        'new_souls': new_souls
+    })
+
+@bp.route('/api/blacksmith/items', methods=['GET'])
+def get_blacksmith_items():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+    
+    user_id = session['user_id']
+    conn = get_db()
+    c = conn.cursor()
+    
+    c.execute('''SELECT id, equipment_id, equipment_slot, upgrade_level
+                 FROM equipment
+                 WHERE user_id = ?
+                 ORDER BY equipment_id, id''', (user_id,))
+    rows = c.fetchall()
+    
+    # If no items, add test item (Lugogova koruna)
+    if not rows:
+        test_equipment_id = 'koruna_lugogu'
+        eq_def = get_item_definition(test_equipment_id)
+        if eq_def:
+            c.execute('''INSERT INTO equipment 
+                         (user_id, equipment_id, equipment_slot, equipped, upgrade_level, acquired_via, acquisition_note)
+                         VALUES (?, ?, ?, 0, 0, 'test', 'Testovací item pro kováře')''',
+                     (user_id, test_equipment_id, eq_def.get('slot', 'helmet')))
+            adjust_item_ownership(c, test_equipment_id)
+            conn.commit()
+            c.execute('''SELECT id, equipment_id, equipment_slot, upgrade_level
+                         FROM equipment WHERE id = ?''', (c.lastrowid,))
+            rows = c.fetchall()
+    conn.close()
+    
+    definitions = catalog_payload('items')['items']
+    items = []
+    for row in rows:
+        equipment_id = row['equipment_id']
+        definition = definitions.get(equipment_id) or {}
+        items.append({
+            'instance_id': row['id'],
+            'equipment_id': equipment_id,
+            'name': definition.get('name', equipment_id),
+            'rarity': definition.get('rarity', 'common'),
+            'slot': definition.get('slot', row['equipment_slot']),
+            'upgrade_level': row['upgrade_level'] or 0,
+            'max_level': BLACKSMITH_MAX_LEVEL,
+            'bonus': definition.get('bonus', {})  # Include base bonuses for display
+        })
+    return jsonify({'success': True, 'items': items})
+
+@bp.route('/api/blacksmith/disassemble', methods=['POST'])
+def blacksmith_disassemble():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+    
+    data = request.get_json() or {}
+    user_id = session['user_id']
+    conn = get_db()
+    c = conn.cursor()
+    
+    if data.get('item_ids'):
+        instance_ids = parse_instance_ids(data)
+    elif data.get('item_id'):
+        # Backward compatibility: single item_id is an equipment_id
+        c.execute('SELECT id FROM equipment WHERE user_id = ? AND equipment_id = ? LIMIT 1',
+                  (user_id, data['item_id']))
+        row = c.fetchone()
+        if not row:
+            conn.close()
+            return jsonify({'success': False, 'error': 'Item nenalezen'}), 404
+        instance_ids = [row['id']]
+    else:
+        conn.close()
+        return jsonify({'success': False, 'error': 'Missing item_id or item_ids'}), 400
+    
+    definitions = catalog_payload('items')['items']
+    disassembled = []
+    removed_per_item = {}
+    for item in load_instances(c, user_id, instance_ids):
+        equipment_id = item['equipment_id']
+        rarity = (definitions.get(equipment_id) or {}).get('rarity', 'common')
+        metal_return, souls_return = disassemble_return(rarity, item['upgrade_level'] or 0)
+        disassembled.append({
+            'instance_id': item['id'],
+            'equipment_id': equipment_id,
+            'metal_gained': metal_return,
+            'souls_gained': souls_return
+        })
+        removed_per_item[equipment_id] = removed_per_item.get(equipment_id, 0) + 1
+    
+    if not disassembled:
+        conn.close()
+        return jsonify({'success': False, 'error': 'Nelze rozbít žádné itemy'}), 400
+    
+    # Remove items; if another request already took some of them, nothing pays out
+    c.executemany('DELETE FROM equipment WHERE user_id = ? AND id = ?',
+                  [(user_id, entry['instance_id']) for entry in disassembled])
+    if c.rowcount != len(disassembled):
+        conn.rollback()
+        conn.close()
+        return jsonify({'success': False, 'error': 'Item se mezitím změnil, zkus to znovu'}), 409
+    for equipment_id, count in removed_per_item.items():
+        adjust_item_ownership(c, equipment_id, -count)
+    close_item_listings(c, [entry['instance_id'] for entry in disassembled])
+    
+    # Credit materials on top of the stored values
+    total_metal_gained = sum(entry['metal_gained'] for entry in disassembled)
+    total_souls_gained = sum(entry['souls_gained'] for entry in disassembled)
+    c.execute('''INSERT INTO blacksmith_materials (user_id, metal, souls) VALUES (?, ?, ?)
+                 ON CONFLICT(user_id) DO UPDATE SET metal = metal + excluded.metal,
+                                                    souls = souls + excluded.souls''',
+              (user_id, total_metal_gained, total_souls_gained))
+    c.execute('SELECT metal, souls FROM blacksmith_materials WHERE user_id = ?', (user_id,))
+    materials = c.fetchone()
+    new_metal = materials['metal']
+    new_souls = materials['souls']
+    
+    conn.commit()
+    conn.close()
+    return jsonify({
+        'success': True,
+        'disassembled': disassembled,
+        'total_metal_gained': total_metal_gained,
+        'total_souls_gained': total_souls_gained,
+        'new_metal': new_metal,
+        'new_souls': new_souls
+    })
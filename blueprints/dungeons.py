@@ -0,0 +1,429 @@
+from flask import Blueprint, request, jsonify, session
+from datetime import datetime, timezone
+import json
+import random
+
+from app import (
+    add_guild_war_points, adjust_item_ownership, adjust_rare_materials, award_experience, calculate_player_combat_stats,
+    ensure_character_stats, ensure_rare_materials, get_all_item_definitions, get_db, record_combat_log,
+    simulate_combat
+)
+from game_data import load_catalog
+from game_data.blobs import register_catalog, catalog_payload
+
+bp = Blueprint('dungeons', __name__)
+
+# Dungeon definitions (game_data/dungeons.json)
+DUNGEON_DEFINITIONS = load_catalog('dungeons')
+
+# ========== DUNGEON SYSTEM ==========
+
+def serialize_dungeon_catalog():
+    """Static part of the dungeon list (definitions, enemies, locations)"""
+    dungeons = []
+    for dungeon_id, dungeon_def in DUNGEON_DEFINITIONS.items():
+        dungeons.append({
+            'id': dungeon_id,
+            'name': dungeon_def['name'],
+            'base_level': dungeon_def['base_level'],
+            'max_floor': dungeon_def['floors'],
+            'main_boss': dungeon_def.get('main_boss', {}),
+            'minibosses': dungeon_def.get('minibosses', []),
+            'common_enemies': dungeon_def.get('common_enemies', []),
+            'locations': dungeon_def.get('locations', [])
+        })
+    return dungeons
+
+def load_dungeon_progress(cursor, user_id):
+    """Per-user dungeon state keyed by dungeon id"""
+    # Get character level
+    char_stats = ensure_character_stats(cursor, user_id)
+    user_level = char_stats['level']
+    
+    # Get user dungeon progress
+    cursor.execute('SELECT * FROM dungeons WHERE user_id = ?', (user_id,))
+    user_dungeons = {row['dungeon_id']: row for row in cursor.fetchall()}
+    
+    progress = {}
+    for dungeon_id, dungeon_def in DUNGEON_DEFINITIONS.items():
+        user_dungeon = user_dungeons.get(dungeon_id)
+        progress[dungeon_id] = {
+            'unlocked': user_level >= dungeon_def['base_level'],
+            'current_floor': user_dungeon['current_floor'] if user_dungeon else 1,
+            'completed_floors': json.loads(user_dungeon['completed_floors']) if user_dungeon and user_dungeon['completed_floors'] else []
+        }
+    return progress
+
+register_catalog('dungeons', lambda: {'dungeons': serialize_dungeon_catalog()})
+
+@bp.route('/api/dungeons/list', methods=['GET'])
+def get_dungeons_list():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+    
+    conn = get_db()
+    c = conn.cursor()
+    progress = load_dungeon_progress(c, session['user_id'])
+    conn.close()
+    
+    # Build dungeon list
+    dungeons = []
+    for dungeon in catalog_payload('dungeons')['dungeons']:
+        entry = dict(dungeon)
+        entry.update(progress[dungeon['id']])
+        dungeons.append(entry)
+    return jsonify({'success': True, 'dungeons': dungeons})
+
+@bp.route('/api/dungeons/progress', methods=['GET'])
+def get_dungeons_progress():
+    """Per-user part of /api/dungeons/list (definitions are in /api/catalog/dungeons)"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+    
+    conn = get_db()
+    c = conn.cursor()
+    progress = load_dungeon_progress(c, session['user_id'])
+    conn.close()
+    return jsonify({'success': True, 'progress': progress})
+
+def get_enemy_for_floor(dungeon_def, floor):
+    """Determine which enemy type is on this floor"""
+    # Check main boss
+    main_boss = dungeon_def.get('main_boss', {})
+    if main_boss.get('floor') == floor:
+        return 'main_boss', main_boss
+    
+    # Check minibosses
+    minibosses = dungeon_def.get('minibosses', [])
+    for miniboss in minibosses:
+        if miniboss.get('floor') == floor:
+            return 'miniboss', miniboss
+    
+    # Otherwise, it's a common enemy
+    common_enemies = dungeon_def.get('common_enemies', [])
+    if common_enemies:
+        # Scale enemy stats based on floor
+        base_enemy = random.choice(common_enemies).copy()
+        floor_multiplier = 1 + (floor - 1) * 0.15  # 15% increase per floor
+        base_enemy['hp'] = int(base_enemy['hp'] * floor_multiplier)
+        base_enemy['attack'] = int(base_enemy['attack'] * floor_multiplier)
+        base_enemy['defense'] = int(base_enemy['defense'] * floor_multiplier)
+        base_enemy['exp'] = int(base_enemy['exp'] * floor_multiplier)
+        base_enemy['gooncoins'] = int(base_enemy['gooncoins'] * floor_multiplier)
+        return 'common', base_enemy
+    
+    return None, None
+
+def build_enemy_stats(enemy_data):
+    """Convert enemy data to combat stats format"""
+    return {
+        'hp': enemy_data.get('hp', 1000),
+        'attack': enemy_data.get('attack', 100),
+        'defense': enemy_data.get('defense', 50),
+        'luck': enemy_data.get('luck', 10),
+        'armor': enemy_data.get('armor', 0)
+    }
+
+DUNGEON_MAX_ROUNDS = 20
+
+def build_dungeon_attacker(player_combat_stats):
+    """Combat-ready player stats with validation"""
+    return {
+        'hp': max(1, player_combat_stats.get('hp', 100)),
+        'attack': max(1, player_combat_stats.get('attack', 10)),
+        'defense': max(0, player_combat_stats.get('defense', 5)),
+        'luck': max(0, player_combat_stats.get('luck', 10))
+    }
+
+def build_dungeon_defender(enemy_data):
+    enemy_stats = build_enemy_stats(enemy_data)
+    return {
+        'hp': max(1, enemy_stats.get('hp', 100)),
+        'attack': max(1, enemy_stats.get('attack', 10)),
+        'defense': max(0, enemy_stats.get('defense', 5)),
+        'luck': max(0, enemy_stats.get('luck', 10))
+    }
+
+def fight_dungeon_floor(cursor, user_id, dungeon_id, floor, attacker_stats):
+    """Resolve one floor and log it; returns (enemy_type, enemy_data, battle) or (None, None, None)"""
+    enemy_type, enemy_data = get_enemy_for_floor(DUNGEON_DEFINITIONS[dungeon_id], floor)
+    if not enemy_data:
+        return None, None, None
+    defender_stats = build_dungeon_defender(enemy_data)
+    battle = simulate_combat(attacker_stats, defender_stats, max_rounds=DUNGEON_MAX_ROUNDS)
+    # Add initial HP values for animation
+    battle['attacker_hp'] = attacker_stats['hp']
+    battle['defender_hp'] = defender_stats['hp']
+    player_won = battle.get('winner') == 'attacker'
+    record_combat_log(cursor, user_id, None, 'dungeon', user_id if player_won else None, battle,
+                      attacker_stats, defender_stats, {
+                          'dungeon': dungeon_id,
+                          'floor': floor,
+                          'enemy_name': enemy_data.get('name', 'Nepřítel'),
+                          'enemy_type': enemy_type
+                      })
+    return enemy_type, enemy_data, battle
+
+def dungeon_floor_rewards(enemy_type, enemy_data):
+    """Rewards for beating a floor (bosses have fixed rewards, common enemies scale)"""
+    if enemy_type in ('main_boss', 'miniboss'):
+        rewards = dict(enemy_data.get('rewards', {}))
+    else:  # common enemy
+        rewards = {
+            'gooncoins': enemy_data.get('gooncoins', 100),
+            'exp': enemy_data.get('exp', 50)
+        }
+    # Chance for item drop (only for bosses)
+    if enemy_type in ('main_boss', 'miniboss') and random.random() < 0.3:
+        item_ids = list(get_all_item_definitions().keys())
+        if item_ids:
+            rewards['item'] = random.choice(item_ids)
+    return rewards
+
+def load_dungeon_row(cursor, user_id, dungeon_id):
+    cursor.execute('''SELECT current_floor, max_floor, completed_floors, total_battles, total_wins, total_losses
+                      FROM dungeons WHERE user_id = ? AND dungeon_id = ?''', (user_id, dungeon_id))
+    row = cursor.fetchone()
+    return dict(row) if row else {}
+
+def save_dungeon_row(cursor, user_id, dungeon_id, existing, cleared_floors, wins, losses, last_result, last_enemy, last_rounds):
+    """Write the dungeon progress row once for any number of fights; returns the new current floor"""
+    dungeon_def = DUNGEON_DEFINITIONS[dungeon_id]
+    completed_floors = json.loads(existing['completed_floors']) if existing.get('completed_floors') else []
+    for floor in cleared_floors:
+        if floor not in completed_floors:
+            completed_floors.append(floor)
+    if cleared_floors:
+        current_floor = min(cleared_floors[-1] + 1, dungeon_def['floors'])
+        max_floor = dungeon_def['floors']
+    else:
+        current_floor = existing.get('current_floor') or 1
+        max_floor = existing.get('max_floor') or dungeon_def['floors']
+    cursor.execute('''INSERT OR REPLACE INTO dungeons 
+                      (user_id, dungeon_id, current_floor, max_floor, completed_floors, last_attempt,
+                       last_battle_result, last_battle_enemy, last_battle_rounds,
+                       total_battles, total_wins, total_losses)
+                      VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                   (user_id, dungeon_id, current_floor, max_floor, json.dumps(completed_floors),
+                    datetime.now(timezone.utc).isoformat(), last_result, last_enemy, last_rounds,
+                    (existing.get('total_battles') or 0) + wins + losses,
+                    (existing.get('total_wins') or 0) + wins,
+                    (existing.get('total_losses') or 0) + losses))
+    return current_floor
+
+def grant_dungeon_items(cursor, user_id, item_ids):
+    """Insert dropped items as equipment rows and keep ownership counters in step"""
+    if not item_ids:
+        return
+    definitions = get_all_item_definitions()
+    cursor.executemany('''INSERT INTO equipment (user_id, equipment_slot, equipment_id, equipped, acquired_via, acquisition_note)
+                          VALUES (?, ?, ?, 0, 'dungeon', 'Kořist z dungeonu')''',
+                       [(user_id, (definitions.get(item_id) or {}).get('slot', 'special'), item_id) for item_id in item_ids])
+    for item_id in set(item_ids):
+        adjust_item_ownership(cursor, item_id, item_ids.count(item_id))
+
+def grant_dungeon_rewards(cursor, user_id, char_stats, rewards):
+    """Apply gooncoins, exp, rare materials and item drops with one write each; returns (progress, new_gooncoins)"""
+    rare_materials = rewards.pop('rare_materials', {})
+    if rare_materials:
+        ensure_rare_materials(cursor, user_id)
+        adjust_rare_materials(cursor, user_id, rare_materials)
+    grant_dungeon_items(cursor, user_id, rewards.get('items', []) + ([rewards['item']] if rewards.get('item') else []))
+    
+    # Update character experience
+    progress = award_experience(cursor, user_id, char_stats, rewards.get('exp', 0))
+    
+    # Update gooncoins
+    new_gooncoins = None
+    gooncoins_gain = rewards.get('gooncoins', 0)
+    if gooncoins_gain > 0:
+        cursor.execute('UPDATE game_state SET gooncoins = COALESCE(gooncoins, 0) + ? WHERE user_id = ?',
+                       (gooncoins_gain, user_id))
+        cursor.execute('SELECT gooncoins FROM game_state WHERE user_id = ?', (user_id,))
+        state = cursor.fetchone()
+        new_gooncoins = state['gooncoins'] if state else None
+    return progress, new_gooncoins
+
+@bp.route('/api/dungeons/fight', methods=['POST'])
+def dungeon_fight():
+    conn = None
+    try:
+        if 'user_id' not in session:
+            return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+        
+        data = request.get_json() or {}
+        dungeon_id = data.get('dungeon_id')
+        floor = data.get('floor', 1)
+        
+        if not dungeon_id or dungeon_id not in DUNGEON_DEFINITIONS:
+            return jsonify({'success': False, 'error': 'Neplatný dungeon'}), 400
+        
+        if not isinstance(floor, int) or floor < 1:
+            return jsonify({'success': False, 'error': 'Neplatné patro'}), 400
+        
+        dungeon_def = DUNGEON_DEFINITIONS[dungeon_id]
+        
+        # Validate floor
+        if floor > dungeon_def.get('floors', 1):
+            return jsonify({'success': False, 'error': f'Patro {floor} neexistuje v tomto dungeonu'}), 400
+        
+        user_id = session['user_id']
+        conn = get_db()
+        c = conn.cursor()
+        
+        char_stats = dict(ensure_character_stats(c, user_id))
+        attacker_stats = build_dungeon_attacker(calculate_player_combat_stats(c, user_id))
+        
+        enemy_type, enemy_data, battle = fight_dungeon_floor(c, user_id, dungeon_id, floor, attacker_stats)
+        if not enemy_data:
+            conn.close()
+            return jsonify({'success': False, 'error': 'Nepřítel nenalezen pro toto patro'}), 400
+        
+        enemy_name = enemy_data.get('name', 'Nepřítel')
+        existing = load_dungeon_row(c, user_id, dungeon_id)
+        
+        if battle.get('winner') != 'attacker':
+            save_dungeon_row(c, user_id, dungeon_id, existing, [], 0, 1, 'defeat', enemy_name, len(battle.get('log', [])))
+            conn.commit()
+            conn.close()
+            return jsonify({
+                'success': True,
+                'victory': False,
+                'enemy_type': enemy_type,
+                'enemy_name': enemy_name,
+                'battle': battle
+            })
+        
+        save_dungeon_row(c, user_id, dungeon_id, existing, [floor], 1, 0, 'victory', enemy_name, len(battle.get('log', [])))
+        add_guild_war_points(c, user_id, 'dungeon_clear')
+        rewards = dungeon_floor_rewards(enemy_type, enemy_data)
+        progress, new_gooncoins = grant_dungeon_rewards(c, user_id, char_stats, rewards)
+        
+        conn.commit()
+        conn.close()
+        
+        return jsonify({
+            'success': True,
+            'victory': True,
+            'enemy_type': enemy_type,
+            'enemy_name': enemy_name,
+            'battle': battle,
+            'rewards': rewards,
+            'new_level': progress['level'],
+            'levels_gained': progress['levels_gained'],
+            'new_gooncoins': new_gooncoins
+        })
+    except Exception as e:
+        # Log the error for debugging
+        import traceback
+        print(f"Error in dungeon_fight: {str(e)}")
+        print(traceback.format_exc())
+        
+        # Close connection if it exists
+        if conn:
+            try:
+                conn.close()
+            except:
+                pass
+        
+        # Return user-friendly error message
+        return jsonify({
+            'success': False,
+            'error': f'Chyba při boji: {str(e)}'
+        }), 500
+
+@bp.route('/api/dungeons/sweep', methods=['POST'])
+def dungeon_sweep():
+    """Fight floors from_floor..to_floor in one request, stopping at the first defeat.
+    Player stats are computed once; rewards and the dungeon row are written once."""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+    
+    data = request.get_json() or {}
+    dungeon_id = data.get('dungeon_id')
+    if not dungeon_id or dungeon_id not in DUNGEON_DEFINITIONS:
+        return jsonify({'success': False, 'error': 'Neplatný dungeon'}), 400
+    
+    dungeon_def = DUNGEON_DEFINITIONS[dungeon_id]
+    from_floor = data.get('from_floor', 1)
+    to_floor = data.get('to_floor', dungeon_def.get('floors', 1))
+    if (not isinstance(from_floor, int) or not isinstance(to_floor, int)
+            or from_floor < 1 or to_floor < from_floor):
+        return jsonify({'success': False, 'error': 'Neplatné patro'}), 400
+    if to_floor > dungeon_def.get('floors', 1):
+        return jsonify({'success': False, 'error': f'Patro {to_floor} neexistuje v tomto dungeonu'}), 400
+    
+    user_id = session['user_id']
+    conn = get_db()
+    c = conn.cursor()
+    
+    char_stats = dict(ensure_character_stats(c, user_id))
+    attacker_stats = build_dungeon_attacker(calculate_player_combat_stats(c, user_id))
+    
+    floors = []
+    cleared = []
+    gooncoins = experience = 0
+    rare_materials = {}
+    items = []
+    last_battle = last_enemy = None
+    for floor in range(from_floor, to_floor + 1):
+        enemy_type, enemy_data, battle = fight_dungeon_floor(c, user_id, dungeon_id, floor, attacker_stats)
+        if not enemy_data:
+            break
+        victory = battle.get('winner') == 'attacker'
+        last_battle = battle
+        last_enemy = enemy_data.get('name', 'Nepřítel')
+        floors.append({
+            'floor': floor,
+            'enemy_type': enemy_type,
+            'enemy_name': last_enemy,
+            'victory': victory,
+            'rounds': battle['rounds']
+        })
+        if not victory:
+            break
+        cleared.append(floor)
+        floor_rewards = dungeon_floor_rewards(enemy_type, enemy_data)
+        gooncoins += floor_rewards.get('gooncoins', 0)
+        experience += floor_rewards.get('exp', 0)
+        for material, amount in floor_rewards.get('rare_materials', {}).items():
+            rare_materials[material] = rare_materials.get(material, 0) + amount
+        if 'item' in floor_rewards:
+            items.append(floor_rewards['item'])
+    
+    if not floors:
+        conn.close()
+        return jsonify({'success': False, 'error': 'Nepřítel nenalezen pro toto patro'}), 400
+    
+    defeated = not floors[-1]['victory']
+    existing = load_dungeon_row(c, user_id, dungeon_id)
+    current_floor = save_dungeon_row(c, user_id, dungeon_id, existing, cleared, len(cleared), int(defeated),
+                                     'defeat' if defeated else 'victory', last_enemy, len(last_battle.get('log', [])))
+    add_guild_war_points(c, user_id, 'dungeon_clear', len(cleared))
+    progress, new_gooncoins = grant_dungeon_rewards(c, user_id, char_stats, {
+        'gooncoins': gooncoins,
+        'exp': experience,
+        'rare_materials': rare_materials,
+        'items': items
+    })
+    
+    conn.commit()
+    conn.close()
+    
+    rewards = {'gooncoins': gooncoins, 'exp': experience}
+    if rare_materials:
+        rewards['rare_materials'] = rare_materials
+    if items:
+        rewards['items'] = items
+    return jsonify({
+        'success': True,
+        'floors': floors,
+        'cleared': len(cleared),
+        'stopped_at': floors[-1]['floor'] if defeated else None,
+        'current_floor': current_floor,
+        'last_battle': last_battle,
+        'rewards': rewards,
+        'new_level': progress['level'],
+        'levels_gained': progress['levels_gained'],
+        'new_gooncoins': new_gooncoins
+    })
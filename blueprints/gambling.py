@@ -0,0 +1,501 @@
+from flask import Blueprint, request, jsonify, session
+import json
+import random
+
+from app import (
+    get_db, hydrate_state_resources, persist_state_resources,
+    refresh_economy_after_change
+)
+
+bp = Blueprint('gambling', __name__)
+
+# Coin Flip Gambling
+@bp.route('/api/gamble/coinflip', methods=['POST'])
+def api_coinflip():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+    
+    data = request.get_json() or {}
+    bet_amount = float(data.get('bet_amount', 0))
+    choice = data.get('choice', 'heads')  # 'heads' or 'tails'
+    currency = data.get('currency', 'gooncoins')
+    
+    if bet_amount <= 0:
+        return jsonify({'success': False, 'error': 'Sázka musí být větší než 0'}), 400
+    
+    if choice not in ['heads', 'tails']:
+        return jsonify({'success': False, 'error': 'Neplatná volba'}), 400
+    
+    user_id = session['user_id']
+    conn = get_db()
+    c = conn.cursor()
+    
+    c.execute('SELECT * FROM game_state WHERE user_id = ?', (user_id,))
+    state = c.fetchone()
+    if not state:
+        conn.close()
+        return jsonify({'success': False, 'error': 'Game state nenalezen'}), 404
+    
+    balances = hydrate_state_resources(state)
+    
+    if balances.get(currency, 0) < bet_amount:
+        conn.close()
+        return jsonify({'success': False, 'error': 'Nemáš dostatek měny'}), 400
+    
+    balances[currency] -= bet_amount
+    
+    # Flip coin (50/50 chance)
+    result = random.choice(['heads', 'tails'])
+    won = (choice == result)
+    
+    # 1.5x multiplier if win (house edge ~25%)
+    if won:
+        winnings = bet_amount * 1.5
+        balances[currency] += winnings
+        net_gain = winnings - bet_amount
+    else:
+        winnings = 0
+        net_gain = -bet_amount
+    
+    persist_state_resources(c, user_id, balances)
+    
+    # Log gambling activity
+    c.execute('''INSERT INTO gambling_log (user_id, game_type, bet_amount, currency, result, winnings, net_gain)
+                 VALUES (?, 'coinflip', ?, ?, ?, ?, ?)''',
+              (user_id, bet_amount, currency, json.dumps({'choice': choice, 'result': result, 'won': won}), winnings, net_gain))
+    
+    conn.commit()
+    conn.close()
+    
+    refresh_economy_after_change()
+    
+    return jsonify({
+        'success': True,
+        'result': result,
+        'choice': choice,
+        'won': won,
+        'bet_amount': bet_amount,
+        'winnings': winnings,
+        'net_gain': net_gain,
+        'balances': {k: balances.get(k, 0) for k in ['gooncoins', 'astma', 'poharky', 'mrkev', 'uzené']}
+    })
+
+# Dice Roll Gambling
+@bp.route('/api/gamble/dice', methods=['POST'])
+def api_dice():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+    
+    data = request.get_json() or {}
+    bet_amount = float(data.get('bet_amount', 0))
+    guess = int(data.get('guess', 1))  # 1-6
+    currency = data.get('currency', 'gooncoins')
+    
+    if bet_amount <= 0:
+        return jsonify({'success': False, 'error': 'Sázka musí být větší než 0'}), 400
+    
+    if guess < 1 or guess > 6:
+        return jsonify({'success': False, 'error': 'Hádej číslo 1-6'}), 400
+    
+    user_id = session['user_id']
+    conn = get_db()
+    c = conn.cursor()
+    
+    c.execute('SELECT * FROM game_state WHERE user_id = ?', (user_id,))
+    state = c.fetchone()
+    if not state:
+        conn.close()
+        return jsonify({'success': False, 'error': 'Game state nenalezen'}), 404
+    
+    balances = hydrate_state_resources(state)
+    
+    if balances.get(currency, 0) < bet_amount:
+        conn.close()
+        return jsonify({'success': False, 'error': 'Nemáš dostatek měny'}), 400
+    
+    balances[currency] -= bet_amount
+    
+    # Roll dice (1-6)
+    result = random.randint(1, 6)
+    won = (guess == result)
+    
+    # 4x multiplier if win (house edge ~33.33%)
+    if won:
+        winnings = bet_amount * 4
+        balances[currency] += winnings
+        net_gain = winnings - bet_amount
+    else:
+        winnings = 0
+        net_gain = -bet_amount
+    
+    persist_state_resources(c, user_id, balances)
+    
+    # Log gambling activity
+    c.execute('''INSERT INTO gambling_log (user_id, game_type, bet_amount, currency, result, winnings, net_gain)
+                 VALUES (?, 'dice', ?, ?, ?, ?, ?)''',
+              (user_id, bet_amount, currency, json.dumps({'guess': guess, 'result': result, 'won': won}), winnings, net_gain))
+    
+    conn.commit()
+    conn.close()
+    
+    refresh_economy_after_change()
+    
+    return jsonify({
+        'success': True,
+        'result': result,
+        'guess': guess,
+        'won': won,
+        'bet_amount': bet_amount,
+        'winnings': winnings,
+        'net_gain': net_gain,
+        'balances': {k: balances.get(k, 0) for k in ['gooncoins', 'astma', 'poharky', 'mrkev', 'uzené']}
+    })
+
+# Slot Machine Gambling
+@bp.route('/api/gamble/slot', methods=['POST'])
+def api_slot():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+    
+    data = request.get_json() or {}
+    bet_amount = float(data.get('bet_amount', 0))
+    currency = data.get('currency', 'gooncoins')
+    
+    if bet_amount <= 0:
+        return jsonify({'success': False, 'error': 'Sázka musí být větší než 0'}), 400
+    
+    user_id = session['user_id']
+    conn = get_db()
+    c = conn.cursor()
+    
+    c.execute('SELECT * FROM game_state WHERE user_id = ?', (user_id,))
+    state = c.fetchone()
+    if not state:
+        conn.close()
+        return jsonify({'success': False, 'error': 'Game state nenalezen'}), 404
+    
+    balances = hydrate_state_resources(state)
+    
+    if balances.get(currency, 0) < bet_amount:
+        conn.close()
+        return jsonify({'success': False, 'error': 'Nemáš dostatek měny'}), 400
+    
+    balances[currency] -= bet_amount
+    
+    # Slot symbols: 💰, 💎, 🍖, 🥕, 🥃, 💨, ⚔️, 👑
+    symbols = ['💰', '💎', '🍖', '🥕', '🥃', '💨', '⚔️', '👑']
+    
+    # Roll 3 reels
+    reel1 = random.choice(symbols)
+    reel2 = random.choice(symbols)
+    reel3 = random.choice(symbols)
+    
+    result = [reel1, reel2, reel3]
+    
+    # Calculate winnings based on combinations
+    winnings = 0
+    multiplier = 0
+    
+    if reel1 == reel2 == reel3:
+        # Three of a kind
+        if reel1 == '👑':
+            multiplier = 30  # Jackpot! (reduced from 50)
+        elif reel1 == '⚔️':
+            multiplier = 15  # (reduced from 25)
+        elif reel1 == '💎':
+            multiplier = 10  # (reduced from 15)
+        elif reel1 == '💰':
+            multiplier = 6  # (reduced from 10)
+        else:
+            multiplier = 3  # (reduced from 5)
+    elif reel1 == reel2 or reel2 == reel3 or reel1 == reel3:
+        # Two of a kind
+        multiplier = 1.5  # (reduced from 2)
+    
+    if multiplier > 0:
+        winnings = bet_amount * multiplier
+        balances[currency] += winnings
+        net_gain = winnings - bet_amount
+    else:
+        net_gain = -bet_amount
+    
+    persist_state_resources(c, user_id, balances)
+    
+    # Log gambling activity
+    c.execute('''INSERT INTO gambling_log (user_id, game_type, bet_amount, currency, result, winnings, net_gain)
+                 VALUES (?, 'slot', ?, ?, ?, ?, ?)''',
+              (user_id, bet_amount, currency, json.dumps({'reels': result, 'multiplier': multiplier}), winnings, net_gain))
+    
+    conn.commit()
+    conn.close()
+    
+    refresh_economy_after_change()
+    
+    return jsonify({
+        'success': True,
+        'reels': result,
+        'multiplier': multiplier,
+        'bet_amount': bet_amount,
+        'winnings': winnings,
+        'net_gain': net_gain,
+        'balances': {k: balances.get(k, 0) for k in ['gooncoins', 'astma', 'poharky', 'mrkev', 'uzené']}
+    })
+
+# Roulette Gambling
+@bp.route('/api/gamble/roulette', methods=['POST'])
+def api_roulette():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+    
+    data = request.get_json() or {}
+    bet_amount = float(data.get('bet_amount', 0))
+    bet_type = data.get('bet_type', 'red')  # 'red', 'black', 'green', or number 0-36
+    currency = data.get('currency', 'gooncoins')
+    
+    if bet_amount <= 0:
+        return jsonify({'success': False, 'error': 'Sázka musí být větší než 0'}), 400
+    
+    user_id = session['user_id']
+    conn = get_db()
+    c = conn.cursor()
+    
+    c.execute('SELECT * FROM game_state WHERE user_id = ?', (user_id,))
+    state = c.fetchone()
+    if not state:
+        conn.close()
+        return jsonify({'success': False, 'error': 'Game state nenalezen'}), 404
+    
+    balances = hydrate_state_resources(state)
+    
+    if balances.get(currency, 0) < bet_amount:
+        conn.close()
+        return jsonify({'success': False, 'error': 'Nemáš dostatek měny'}), 400
+    
+    balances[currency] -= bet_amount
+    
+    # Spin roulette (0-36, 0 is green)
+    result = random.randint(0, 36)
+    
+    # Determine color
+    if result == 0:
+        color = 'green'
+    elif result in [1, 3, 5, 7, 9, 12, 14, 16, 18, 19, 21, 23, 25, 27, 30, 32, 34, 36]:
+        color = 'red'
+    else:
+        color = 'black'
+    
+    won = False
+    multiplier = 0
+    
+    if bet_type == 'red' and color == 'red':
+        won = True
+        multiplier = 2  # 2x for color bet
+    elif bet_type == 'black' and color == 'black':
+        won = True
+        multiplier = 2
+    elif bet_type == 'green' and color == 'green':
+        won = True
+        multiplier = 35  # 35x for green (0)
+    elif bet_type.isdigit() and int(bet_type) == result:
+        won = True
+        multiplier = 35  # 35x for exact number
+    
+    if won:
+        winnings = bet_amount * multiplier
+        balances[currency] += winnings
+        net_gain = winnings - bet_amount
+    else:
+        winnings = 0
+        net_gain = -bet_amount
+    
+    persist_state_resources(c, user_id, balances)
+    
+    # Log gambling activity
+    c.execute('''INSERT INTO gambling_log (user_id, game_type, bet_amount, currency, result, winnings, net_gain)
+                 VALUES (?, 'roulette', ?, ?, ?, ?, ?)''',
+              (user_id, bet_amount, currency, json.dumps({'bet_type': bet_type, 'result': result, 'color': color, 'won': won}), winnings, net_gain))
+    
+    conn.commit()
+    conn.close()
+    
+    refresh_economy_after_change()
+    
+    return jsonify({
+        'success': True,
+        'result': result,
+        'color': color,
+        'bet_type': bet_type,
+        'won': won,
+        'multiplier': multiplier,
+        'bet_amount': bet_amount,
+        'winnings': winnings,
+        'net_gain': net_gain,
+        'balances': {k: balances.get(k, 0) for k in ['gooncoins', 'astma', 'poharky', 'mrkev', 'uzené']}
+    })
+
+# Number Guess Gambling (1-100)
+@bp.route('/api/gamble/number', methods=['POST'])
+def api_number_guess():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+    
+    data = request.get_json() or {}
+    bet_amount = float(data.get('bet_amount', 0))
+    guess = int(data.get('guess', 50))  # 1-100
+    currency = data.get('currency', 'gooncoins')
+    
+    if bet_amount <= 0:
+        return jsonify({'success': False, 'error': 'Sázka musí být větší než 0'}), 400
+    
+    if guess < 1 or guess > 100:
+        return jsonify({'success': False, 'error': 'Hádej číslo 1-100'}), 400
+    
+    user_id = session['user_id']
+    conn = get_db()
+    c = conn.cursor()
+    
+    c.execute('SELECT * FROM game_state WHERE user_id = ?', (user_id,))
+    state = c.fetchone()
+    if not state:
+        conn.close()
+        return jsonify({'success': False, 'error': 'Game state nenalezen'}), 404
+    
+    balances = hydrate_state_resources(state)
+    
+    if balances.get(currency, 0) < bet_amount:
+        conn.close()
+        return jsonify({'success': False, 'error': 'Nemáš dostatek měny'}), 400
+    
+    balances[currency] -= bet_amount
+    
+    # Generate random number 1-100
+    result = random.randint(1, 100)
+    won = (guess == result)
+    
+    # 80x multiplier if win (house edge ~1%)
+    if won:
+        winnings = bet_amount * 80
+        balances[currency] += winnings
+        net_gain = winnings - bet_amount
+    else:
+        winnings = 0
+        net_gain = -bet_amount
+    
+    persist_state_resources(c, user_id, balances)
+    
+    # Log gambling activity
+    c.execute('''INSERT INTO gambling_log (user_id, game_type, bet_amount, currency, result, winnings, net_gain)
+                 VALUES (?, 'number_guess', ?, ?, ?, ?, ?)''',
+              (user_id, bet_amount, currency, json.dumps({'guess': guess, 'result': result, 'won': won}), winnings, net_gain))
+    
+    conn.commit()
+    conn.close()
+    
+    refresh_economy_after_change()
+    
+    return jsonify({
+        'success': True,
+        'result': result,
+        'guess': guess,
+        'won': won,
+        'bet_amount': bet_amount,
+        'winnings': winnings,
+        'net_gain': net_gain,
+        'balances': {k: balances.get(k, 0) for k in ['gooncoins', 'astma', 'poharky', 'mrkev', 'uzené']}
+    })
+
+# Blackjack-style Gambling (simplified)
+@bp.route('/api/gamble/blackjack', methods=['POST'])
+def api_blackjack():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+    
+    data = request.get_json() or {}
+    bet_amount = float(data.get('bet_amount', 0))
+    action = data.get('action', 'stand')  # 'hit' or 'stand'
+    currency = data.get('currency', 'gooncoins')
+    
+    if bet_amount <= 0:
+        return jsonify({'success': False, 'error': 'Sázka musí být větší než 0'}), 400
+    
+    user_id = session['user_id']
+    conn = get_db()
+    c = conn.cursor()
+    
+    c.execute('SELECT * FROM game_state WHERE user_id = ?', (user_id,))
+    state = c.fetchone()
+    if not state:
+        conn.close()
+        return jsonify({'success': False, 'error': 'Game state nenalezen'}), 404
+    
+    balances = hydrate_state_resources(state)
+    
+    if balances.get(currency, 0) < bet_amount:
+        conn.close()
+        return jsonify({'success': False, 'error': 'Nemáš dostatek měny'}), 400
+    
+    balances[currency] -= bet_amount
+    
+    # Simplified blackjack: player gets 2 cards, dealer gets 2 cards
+    # Player can hit (get one more card) or stand
+    player_cards = [random.randint(1, 11) for _ in range(2)]
+    dealer_cards = [random.randint(1, 11) for _ in range(2)]
+    
+    if action == 'hit':
+        player_cards.append(random.randint(1, 11))
+    
+    player_total = sum(player_cards)
+    dealer_total = sum(dealer_cards)
+    
+    # Dealer hits if total < 17
+    while dealer_total < 17:
+        dealer_cards.append(random.randint(1, 11))
+        dealer_total = sum(dealer_cards)
+    
+    # Determine winner
+    won = False
+    if player_total > 21:
+        won = False  # Player bust
+    elif dealer_total > 21:
+        won = True  # Dealer bust
+    elif player_total > dealer_total:
+        won = True  # Player wins
+    elif player_total == dealer_total:
+        won = False  # Push (tie)
+    else:
+        won = False  # Dealer wins
+    
+    # 2x multiplier if win (house edge ~8% with simplified rules)
+    if won:
+        winnings = bet_amount * 2
+        balances[currency] += winnings
+        net_gain = winnings - bet_amount
+    else:
+        winnings = 0
+        net_gain = -bet_amount
+    
+    persist_state_resources(c, user_id, balances)
+    
+    # Log gambling activity
+    c.execute('''INSERT INTO gambling_log (user_id, game_type, bet_amount, currency, result, winnings, net_gain)
+                 VALUES (?, 'blackjack', ?, ?, ?, ?, ?)''',
+              (user_id, bet_amount, currency, json.dumps({'player_cards': player_cards, 'dealer_cards': dealer_cards, 'player_total': player_total, 'dealer_total': dealer_total, 'action': action, 'won': won}), winnings, net_gain))
+    
+    conn.commit()
+    conn.close()
+    
+    refresh_economy_after_change()
+    
+    return jsonify({
+        'success': True,
+        'player_cards': player_cards,
+        'dealer_cards': dealer_cards,
+        'player_total': player_total,
+        'dealer_total': dealer_total,
+        'action': action,
+        'won': won,
+        'bet_amount': bet_amount,
+        'winnings': winnings,
+        'net_gain': net_gain,
+        'balances': {k: balances.get(k, 0) for k in ['gooncoins', 'astma', 'poharky', 'mrkev', 'uzené']}
+    })
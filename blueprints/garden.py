@@ -0,0 +1,264 @@
+from flask import Blueprint, request, jsonify, session
+from datetime import datetime, timedelta, timezone
+
+from app import (
+    add_fruit_stacks, apply_inflation_to_cost, calculate_inflation_multiplier, deduct_cost,
+    get_current_inflation_rate, get_db, hydrate_state_resources, load_fruit_stacks,
+    persist_resources, refresh_economy_after_change, resources_payload
+)
+from game_data import load_catalog
+from game_data.blobs import register_catalog, catalog_payload
+
+bp = Blueprint('garden', __name__)
+
+# Garden System - Seed Definitions (game_data/seeds.json)
+SEED_DEFS = load_catalog('seeds')
+
+GARDEN_MAX_PLANT_BATCH = 50  # seeds planted by one /api/garden/plant request
+
+def load_garden_state(cursor, user_id):
+    """Get user's garden plots and fruit stock"""
+    now = datetime.now(timezone.utc).isoformat()
+    cursor.execute('''SELECT id, seed_id, seed_name, produces, ready_at,
+                             MAX(0, CAST(ROUND((julianday(ready_at) - julianday(?)) * 86400) AS INTEGER)) AS time_remaining,
+                             ready_at <= ? AS is_ready
+                      FROM garden_plots WHERE user_id = ? ORDER BY planted_at DESC''', (now, now, user_id))
+    plots = [{
+        'id': plot_row['id'],
+        'seed_id': plot_row['seed_id'],
+        'seed_name': plot_row['seed_name'],
+        'produces': plot_row['produces'],
+        'ready_at': plot_row['ready_at'],
+        'time_remaining': plot_row['time_remaining'],
+        'is_ready': bool(plot_row['is_ready'])
+    } for plot_row in cursor.fetchall()]
+    
+    # Get user's fruit stacks (rarity fruits are always listed, even when empty)
+    fruits = dict.fromkeys(('fruit_common', 'fruit_rare', 'fruit_epic', 'fruit_legendary', 'fruit_unique'), 0)
+    fruits.update(load_fruit_stacks(cursor, user_id))
+    return plots, fruits
+
+def serialize_available_seeds():
+    available_seeds = []
+    for seed_id, seed_def in SEED_DEFS.items():
+        available_seeds.append({
+            'seed_id': seed_def['seed_id'],
+            'name': seed_def['name'],
+            'description': seed_def['description'],
+            'rarity': seed_def['rarity'],
+            'cost': seed_def['cost'],
+            'growth_time': seed_def['growth_time'],
+            'fruit_id': seed_def['fruit_id'],
+            'fruit_name': seed_def['fruit_name'],
+            'fruit_icon': seed_def['fruit_icon']
+        })
+    return available_seeds
+
+register_catalog('seeds', lambda: {'available_seeds': serialize_available_seeds()})
+
+def plant_seeds(cursor, user_id, seed_def, count):
+    """Insert `count` plots of one seed; ready_at drives all readiness queries"""
+    planted_at = datetime.now(timezone.utc)
+    ready_at = planted_at + timedelta(seconds=seed_def['growth_time'])
+    row = (user_id, seed_def['seed_id'], seed_def['name'], seed_def['fruit_name'],
+           planted_at.isoformat(), seed_def['growth_time'], ready_at.isoformat())
+    cursor.executemany('''INSERT INTO garden_plots (user_id, seed_id, seed_name, produces, planted_at, growth_time, ready_at)
+                          VALUES (?, ?, ?, ?, ?, ?, ?)''', [row] * count)
+
+def harvest_ready_plots(cursor, user_id, plot_id=None):
+    """Move ready plots (ready_at <= now, via idx_garden_plots_ready) into the
+    user's fruit stacks. Returns {fruit_id: count} of harvested fruit, or None
+    when a concurrent harvest took some of the plots first (caller rolls back)."""
+    now = datetime.now(timezone.utc).isoformat()
+    query = 'SELECT id, seed_id FROM garden_plots WHERE user_id = ? AND ready_at <= ?'
+    params = [user_id, now]
+    if plot_id is not None:
+        query += ' AND id = ?'
+        params.append(plot_id)
+    cursor.execute(query, params)
+    
+    harvested_ids = []
+    fruit_counts = {}
+    for plot in cursor.fetchall():
+        seed_def = SEED_DEFS.get(plot['seed_id'])
+        if not seed_def:
+            continue
+        fruit_id = seed_def['fruit_id']
+        harvested_ids.append((plot['id'],))
+        fruit_counts[fruit_id] = fruit_counts.get(fruit_id, 0) + 1
+    
+    if harvested_ids:
+        # Delete first, with the same guards as the SELECT; fruit is only
+        # credited when every plot read above was removed by this request
+        cursor.executemany('DELETE FROM garden_plots WHERE id = ? AND user_id = ? AND ready_at <= ?',
+                           [(plot_id, user_id, now) for (plot_id,) in harvested_ids])
+        if cursor.rowcount != len(harvested_ids):
+            return None
+        add_fruit_stacks(cursor, user_id, fruit_counts)
+    return fruit_counts
+
+def describe_harvest(fruit_counts):
+    parts = []
+    for fruit_id, count in fruit_counts.items():
+        seed_def = next((seed for seed in SEED_DEFS.values() if seed['fruit_id'] == fruit_id), {})
+        label = f"{seed_def.get('fruit_icon', '')} {seed_def.get('fruit_name', fruit_id)}".strip()
+        parts.append(f'{count}× {label}' if count > 1 else label)
+    return ', '.join(parts)
+
+@bp.route('/api/garden', methods=['GET'])
+def get_garden():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+    
+    conn = get_db()
+    c = conn.cursor()
+    plots, fruits = load_garden_state(c, session['user_id'])
+    conn.close()
+    return jsonify({
+        'success': True,
+        'plots': plots,
+        'fruits': fruits,
+        'available_seeds': catalog_payload('seeds')['available_seeds']
+    })
+
+@bp.route('/api/garden/state', methods=['GET'])
+def get_garden_state():
+    """Per-user part of /api/garden (seeds are in /api/catalog/seeds)"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+    
+    conn = get_db()
+    c = conn.cursor()
+    plots, fruits = load_garden_state(c, session['user_id'])
+    conn.close()
+    return jsonify({'success': True, 'plots': plots, 'fruits': fruits})
+
+@bp.route('/api/garden/buy-seed', methods=['POST'])
+def buy_seed():
+    return plant_seed_batch(1)
+
+@bp.route('/api/garden/plant', methods=['POST'])
+def plant_many():
+    """Buy and plant N seeds of one kind in one transaction"""
+    data = request.get_json(silent=True) or {}
+    try:
+        count = int(data.get('count', 1))
+    except (TypeError, ValueError):
+        count = 0
+    if count < 1 or count > GARDEN_MAX_PLANT_BATCH:
+        return jsonify({'success': False, 'error': f'Počet musí být 1 až {GARDEN_MAX_PLANT_BATCH}'}), 400
+    return plant_seed_batch(count)
+
+def plant_seed_batch(count):
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+    
+    data = request.get_json(silent=True) or {}
+    seed_id = data.get('seed_id')
+    
+    if not seed_id or seed_id not in SEED_DEFS:
+        return jsonify({'success': False, 'error': 'Neplatné semínko'}), 400
+    
+    user_id = session['user_id']
+    conn = get_db()
+    c = conn.cursor()
+    
+    # Get current state
+    c.execute('SELECT * FROM game_state WHERE user_id = ?', (user_id,))
+    state = c.fetchone()
+    resources = hydrate_state_resources(state)
+    
+    seed_def = SEED_DEFS[seed_id]
+    cost = {resource: amount * count for resource, amount in seed_def['cost'].items()}
+    inflation_rate = get_current_inflation_rate(c)
+    inflation_multiplier = calculate_inflation_multiplier(inflation_rate)
+    effective_cost = apply_inflation_to_cost(cost, inflation_multiplier)
+    
+    # Check if affordable
+    affordable, lacking = deduct_cost(resources, effective_cost)
+    if not affordable:
+        conn.close()
+        return jsonify({'success': False, 'error': f'Nemáte dostatek zdrojů ({lacking})'}), 400
+    
+    plant_seeds(c, user_id, seed_def, count)
+    persist_resources(c, user_id, resources)
+    conn.commit()
+    conn.close()
+    
+    refresh_economy_after_change()
+    resource_payload = resources_payload(resources)
+    
+    message = f'Semínko {seed_def["name"]} zasazeno!' if count == 1 else f'Zasazeno {count}× {seed_def["name"]}!'
+    return jsonify({
+        'success': True,
+        **resource_payload,
+        'planted': count,
+        'message': message
+    })
+
+@bp.route('/api/garden/harvest', methods=['POST'])
+def harvest_plot():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+    
+    data = request.get_json() or {}
+    plot_id = data.get('plot_id')
+    
+    if not plot_id:
+        return jsonify({'success': False, 'error': 'Chybí ID záhonku'}), 400
+    
+    user_id = session['user_id']
+    conn = get_db()
+    c = conn.cursor()
+    
+    fruit_counts = harvest_ready_plots(c, user_id, plot_id)
+    if fruit_counts is None:
+        conn.rollback()
+        conn.close()
+        return jsonify({'success': False, 'error': 'Záhon už byl sklizen'}), 409
+    if not fruit_counts:
+        c.execute('SELECT seed_id FROM garden_plots WHERE id = ? AND user_id = ?', (plot_id, user_id))
+        plot = c.fetchone()
+        conn.close()
+        if not plot:
+            return jsonify({'success': False, 'error': 'Záhon nenalezen'}), 404
+        if plot['seed_id'] not in SEED_DEFS:
+            return jsonify({'success': False, 'error': 'Neplatné semínko'}), 400
+        return jsonify({'success': False, 'error': 'Záhon ještě není připraven ke sklizni'}), 400
+    
+    conn.commit()
+    conn.close()
+    
+    return jsonify({
+        'success': True,
+        'message': f'Sklizeno! Získal jsi {describe_harvest(fruit_counts)}!'
+    })
+
+@bp.route('/api/garden/harvest-all', methods=['POST'])
+def harvest_all():
+    """Harvest every ready plot in one transaction"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+    
+    user_id = session['user_id']
+    conn = get_db()
+    c = conn.cursor()
+    
+    fruit_counts = harvest_ready_plots(c, user_id)
+    if fruit_counts is None:
+        conn.rollback()
+        conn.close()
+        return jsonify({'success': False, 'error': 'Záhony se mezitím sklidily, zkus to znovu'}), 409
+    if not fruit_counts:
+        conn.close()
+        return jsonify({'success': False, 'error': 'Žádný záhon není připraven ke sklizni'}), 400
+    
+    conn.commit()
+    conn.close()
+    
+    return jsonify({
+        'success': True,
+        'harvested': sum(fruit_counts.values()),
+        'fruits': fruit_counts,
+        'message': f'Sklizeno! Získal jsi {describe_harvest(fruit_counts)}!'
+    })
@@ -0,0 +1,307 @@
+from flask import Blueprint, request, jsonify, session
+from datetime import datetime, timedelta, timezone
+import sqlite3
+import time
+
+import click
+
+from app import (
+    get_db, job_queue, settle_guild_wars
+)
+
+bp = Blueprint('guilds', __name__)
+
+GUILD_BONUS_BASE = {
+    'exp': 0.05,  # 5% base exp bonus
+    'gold': 0.05  # 5% base gooncoins bonus (kept as 'gold' in DB for compatibility)
+}
+
+GUILD_WAR_DURATION = 3600  # 1 hour in seconds
+GUILD_WAR_SETTLE_INTERVAL = 60  # seconds between settlement checks
+
+_settle_state = {'last_run': 0.0}
+
+
+@bp.before_request
+def schedule_war_settlement():
+    """Queue settlement of finished wars, at most once per interval"""
+    now = time.monotonic()
+    if now - _settle_state['last_run'] < GUILD_WAR_SETTLE_INTERVAL:
+        return
+    _settle_state['last_run'] = now
+    job_queue.submit('settle_guild_wars')
+
+
+@bp.cli.command('settle-wars')
+def settle_wars_command():
+    """Settle guild wars past their end time (for cron)"""
+    click.echo(f'Settled {settle_guild_wars()} war(s)')
+
+# ========== GUILD SYSTEM ==========
+
+@bp.route('/api/guilds/list', methods=['GET'])
+def get_guilds_list():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+    
+    conn = get_db()
+    c = conn.cursor()
+    
+    c.execute('SELECT * FROM guilds ORDER BY member_count DESC')
+    
+    guilds = []
+    for row in c.fetchall():
+        guilds.append({
+            'id': row['id'],
+            'name': row['name'],
+            'description': row['description'],
+            'exp_bonus': row['exp_bonus'],
+            'gold_bonus': row['gold_bonus'],
+            'member_count': row['member_count'],
+            'at_war': row['active_war_id'] is not None
+        })
+    
+    conn.close()
+    return jsonify({'success': True, 'guilds': guilds})
+
+@bp.route('/api/guilds/create', methods=['POST'])
+def create_guild():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+    
+    data = request.get_json() or {}
+    name = data.get('name')
+    description = data.get('description', '')
+    
+    if not name:
+        return jsonify({'success': False, 'error': 'Chybí název guildy'}), 400
+    
+    user_id = session['user_id']
+    conn = get_db()
+    c = conn.cursor()
+    
+    # Check if user is already in a guild
+    c.execute('SELECT guild_id FROM guild_members WHERE user_id = ?', (user_id,))
+    if c.fetchone():
+        conn.close()
+        return jsonify({'success': False, 'error': 'Už jsi v guildě'}), 400
+    
+    # Create guild
+    try:
+        c.execute('''INSERT INTO guilds (name, description, leader_id, exp_bonus, gold_bonus, member_count)
+                     VALUES (?, ?, ?, ?, ?, 1)''',
+                 (name, description, user_id, GUILD_BONUS_BASE['exp'], GUILD_BONUS_BASE['gold']))
+        guild_id = c.lastrowid
+        
+        # Add creator as leader
+        c.execute('''INSERT INTO guild_members (guild_id, user_id, role)
+                     VALUES (?, ?, 'leader')''', (guild_id, user_id))
+        
+        conn.commit()
+        conn.close()
+        return jsonify({'success': True, 'guild_id': guild_id})
+    except sqlite3.IntegrityError:
+        conn.close()
+        return jsonify({'success': False, 'error': 'Guilda s tímto názvem už existuje'}), 400
+
+@bp.route('/api/guilds/join', methods=['POST'])
+def join_guild():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+    
+    data = request.get_json() or {}
+    guild_id = data.get('guild_id')
+    
+    if not guild_id:
+        return jsonify({'success': False, 'error': 'Chybí guild_id'}), 400
+    
+    user_id = session['user_id']
+    conn = get_db()
+    c = conn.cursor()
+    
+    # Check if user is already in a guild
+    c.execute('SELECT guild_id FROM guild_members WHERE user_id = ?', (user_id,))
+    if c.fetchone():
+        conn.close()
+        return jsonify({'success': False, 'error': 'Už jsi v guildě'}), 400
+    
+    # Check if guild exists
+    c.execute('SELECT id FROM guilds WHERE id = ?', (guild_id,))
+    if not c.fetchone():
+        conn.close()
+        return jsonify({'success': False, 'error': 'Guilda nenalezena'}), 404
+    
+    # Join guild
+    try:
+        c.execute('''INSERT INTO guild_members (guild_id, user_id, role)
+                     VALUES (?, ?, 'member')''', (guild_id, user_id))
+        c.execute('UPDATE guilds SET member_count = member_count + 1 WHERE id = ?', (guild_id,))
+        conn.commit()
+        conn.close()
+        return jsonify({'success': True})
+    except sqlite3.IntegrityError:
+        conn.close()
+        return jsonify({'success': False, 'error': 'Už jsi v této guildě'}), 400
+
+@bp.route('/api/guilds/my', methods=['GET'])
+def get_my_guild():
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+    
+    user_id = session['user_id']
+    conn = get_db()
+    c = conn.cursor()
+    
+    c.execute('''SELECT g.*, gm.role
+                 FROM guilds g
+                 JOIN guild_members gm ON g.id = gm.guild_id
+                 WHERE gm.user_id = ?''', (user_id,))
+    guild = c.fetchone()
+    
+    if not guild:
+        conn.close()
+        return jsonify({'success': True, 'guild': None})
+    
+    # Get members
+    c.execute('''SELECT u.username, gm.role, gm.joined_at
+                 FROM guild_members gm
+                 JOIN users u ON gm.user_id = u.id
+                 WHERE gm.guild_id = ?
+                 ORDER BY gm.role DESC, gm.joined_at ASC''', (guild['id'],))
+    
+    members = []
+    for row in c.fetchall():
+        members.append({
+            'username': row['username'],
+            'role': row['role'],
+            'joined_at': row['joined_at']
+        })
+    
+    conn.close()
+    return jsonify({
+        'success': True,
+        'guild': {
+            'id': guild['id'],
+            'name': guild['name'],
+            'description': guild['description'],
+            'exp_bonus': guild['exp_bonus'],
+            'gold_bonus': guild['gold_bonus'],
+            'role': guild['role'],
+            'member_count': guild['member_count'],
+            'active_war_id': guild['active_war_id'],
+            'members': members
+        }
+    })
+
+# ========== GUILD WARS ==========
+
+def serialize_war(cursor, war):
+    cursor.execute('''SELECT s.*, g.name FROM guild_war_scores s
+                      JOIN guilds g ON g.id = s.guild_id
+                      WHERE s.war_id = ?''', (war['id'],))
+    scores = {row['guild_id']: row for row in cursor.fetchall()}
+    sides = []
+    for guild_id in (war['guild1_id'], war['guild2_id']):
+        row = scores.get(guild_id)
+        sides.append({
+            'guild_id': guild_id,
+            'name': row['name'] if row else None,
+            'points': row['points'] if row else 0,
+            'pvp_wins': row['pvp_wins'] if row else 0,
+            'dungeon_clears': row['dungeon_clears'] if row else 0,
+            'gooncoins_earned': row['gooncoins_earned'] if row else 0
+        })
+    return {
+        'id': war['id'],
+        'status': war['status'],
+        'started_at': war['started_at'],
+        'ends_at': war['ends_at'],
+        'ended_at': war['ended_at'],
+        'winner_id': war['winner_id'],
+        'sides': sides
+    }
+
+@bp.route('/api/guilds/war', methods=['GET'])
+def get_guild_war():
+    """Running (or most recent) war of the player's guild with both score counters"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+    
+    user_id = session['user_id']
+    conn = get_db()
+    c = conn.cursor()
+    
+    c.execute('SELECT guild_id FROM guild_members WHERE user_id = ?', (user_id,))
+    member = c.fetchone()
+    if not member:
+        conn.close()
+        return jsonify({'success': True, 'war': None})
+    
+    c.execute('''SELECT * FROM guild_wars
+                 WHERE guild1_id = ? OR guild2_id = ?
+                 ORDER BY id DESC LIMIT 1''', (member['guild_id'], member['guild_id']))
+    war = c.fetchone()
+    if not war:
+        conn.close()
+        return jsonify({'success': True, 'war': None})
+    
+    payload = serialize_war(c, war)
+    conn.close()
+    now_iso = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    if war['status'] == 'active' and war['ends_at'] <= now_iso:
+        job_queue.submit('settle_guild_wars')
+    return jsonify({'success': True, 'war': payload})
+
+@bp.route('/api/guilds/war/declare', methods=['POST'])
+def declare_guild_war():
+    """Guild leader starts a GUILD_WAR_DURATION war against another guild"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+    
+    data = request.get_json() or {}
+    target_id = data.get('guild_id')
+    if not target_id:
+        return jsonify({'success': False, 'error': 'Chybí guild_id'}), 400
+    
+    user_id = session['user_id']
+    conn = get_db()
+    c = conn.cursor()
+    
+    c.execute('''SELECT g.id, g.active_war_id, gm.role
+                 FROM guild_members gm
+                 JOIN guilds g ON g.id = gm.guild_id
+                 WHERE gm.user_id = ?''', (user_id,))
+    own = c.fetchone()
+    if not own or own['role'] != 'leader':
+        conn.close()
+        return jsonify({'success': False, 'error': 'Válku může vyhlásit jen vůdce guildy'}), 403
+    
+    c.execute('SELECT id, active_war_id FROM guilds WHERE id = ?', (target_id,))
+    target = c.fetchone()
+    if not target:
+        conn.close()
+        return jsonify({'success': False, 'error': 'Guilda nenalezena'}), 404
+    if target['id'] == own['id']:
+        conn.close()
+        return jsonify({'success': False, 'error': 'Nemůžeš vyhlásit válku vlastní guildě'}), 400
+    if own['active_war_id'] or target['active_war_id']:
+        conn.close()
+        return jsonify({'success': False, 'error': 'Jedna z guild už je ve válce'}), 400
+    
+    now = datetime.now(timezone.utc)
+    ends_at = (now + timedelta(seconds=GUILD_WAR_DURATION)).isoformat(timespec='seconds')
+    c.execute('''INSERT INTO guild_wars (guild1_id, guild2_id, started_at, ends_at, status)
+                 VALUES (?, ?, ?, ?, 'active')''', (own['id'], target['id'], now.isoformat(timespec='seconds'), ends_at))
+    war_id = c.lastrowid
+    # Both guilds must still be free; a concurrent declaration loses here
+    c.execute('UPDATE guilds SET active_war_id = ? WHERE id IN (?, ?) AND active_war_id IS NULL',
+              (war_id, own['id'], target['id']))
+    if c.rowcount != 2:
+        conn.rollback()
+        conn.close()
+        return jsonify({'success': False, 'error': 'Jedna z guild už je ve válce'}), 400
+    c.executemany('INSERT INTO guild_war_scores (war_id, guild_id) VALUES (?, ?)',
+                  [(war_id, own['id']), (war_id, target['id'])])
+    conn.commit()
+    conn.close()
+    return jsonify({'success': True, 'war_id': war_id, 'ends_at': ends_at})
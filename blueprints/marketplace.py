@@ -0,0 +1,413 @@
+from flask import Blueprint, request, jsonify, session
+from datetime import datetime, timedelta, timezone
+import base64
+import json
+import sqlite3
+import threading
+import time
+
+import click
+
+from app import (
+    RESOURCE_LABELS_BACKEND, extract_player_resources, get_db, persist_resources,
+    record_item_trade, refresh_economy_after_change, resources_payload
+)
+from game_data.blobs import catalog_payload
+
+bp = Blueprint('marketplace', __name__)
+
+MARKETPLACE_LISTING_DAYS = 7
+MARKETPLACE_PAGE_SIZE = 50
+MARKETPLACE_MAX_PAGE_SIZE = 100
+MARKETPLACE_BOOK_DEPTH = 20
+MARKETPLACE_HISTORY_BUCKETS = 48  # hourly buckets returned with an order book
+MARKETPLACE_SWEEP_INTERVAL = 60  # seconds between expiry sweeps
+MARKETPLACE_SORTS = {
+    # sort name -> (ORDER BY, keyset condition for the next page)
+    'newest': ('m.id DESC', 'm.id < ?'),
+    'price_asc': ('m.price ASC, m.id ASC', '(m.price, m.id) > (?, ?)'),
+    'price_desc': ('m.price DESC, m.id DESC', '(m.price, m.id) < (?, ?)'),
+}
+
+_sweep_lock = threading.Lock()
+_sweep_state = {'last_run': 0.0}
+
+
+# ========== MARKETPLACE HELPERS ==========
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, size):
+    """Opaque page cursor -> list of `size` keyset values; ValueError when malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError('invalid cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('invalid cursor')
+    if not all(isinstance(value, (int, float)) for value in values):
+        raise ValueError('invalid cursor')
+    return values
+
+
+def parse_limit(value, default, maximum):
+    try:
+        return max(1, min(maximum, int(value)))
+    except (TypeError, ValueError):
+        return default
+
+
+def serialize_listing(row, items):
+    item_def = items.get(row['equipment_id']) or {}
+    return {
+        'listing_id': row['id'],
+        'seller_id': row['seller_id'],
+        'seller_name': row['seller_name'],
+        'item_instance_id': row['item_instance_id'],
+        'equipment_id': row['equipment_id'],
+        'item_name': item_def.get('name', row['equipment_id']),
+        'slot': row['slot'] or item_def.get('slot'),
+        'rarity': row['rarity'] or item_def.get('rarity', 'common'),
+        'image': item_def.get('image'),
+        'price': row['price'],
+        'currency': row['currency'],
+        'created_at': row['created_at']
+    }
+
+
+def sweep_expired_listings(now=None):
+    """Close active listings past expires_at; returns number of listings expired"""
+    now_iso = (now or datetime.now(timezone.utc)).isoformat()
+    conn = get_db()
+    c = conn.cursor()
+    c.execute('''UPDATE item_marketplace
+                 SET status = 'expired', closed_at = ?
+                 WHERE status = 'active' AND expires_at <= ?''', (now_iso, now_iso))
+    expired = c.rowcount
+    conn.commit()
+    conn.close()
+    return expired
+
+
+def _run_sweep():
+    try:
+        sweep_expired_listings()
+    except sqlite3.OperationalError:
+        pass  # Database busy, the next sweep picks the listings up
+    finally:
+        _sweep_lock.release()
+
+
+@bp.before_request
+def schedule_expiry_sweep():
+    """Expire stale listings in a background thread, at most once per interval"""
+    now = time.monotonic()
+    if now - _sweep_state['last_run'] < MARKETPLACE_SWEEP_INTERVAL:
+        return
+    if not _sweep_lock.acquire(blocking=False):
+        return
+    _sweep_state['last_run'] = now
+    threading.Thread(target=_run_sweep, name='marketplace-sweeper', daemon=True).start()
+
+
+@bp.cli.command('sweep')
+def sweep_command():
+    """Expire stale marketplace listings (for cron)"""
+    click.echo(f'Expired {sweep_expired_listings()} listing(s)')
+
+
+# ========== MARKETPLACE ==========
+
+@bp.route('/api/marketplace/list', methods=['GET'])
+def get_marketplace_list():
+    """Browse active listings; filters: item, slot, rarity, currency, min_price, max_price"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Not authenticated'}), 401
+
+    args = request.args
+    sort = args.get('sort', 'newest')
+    if sort not in MARKETPLACE_SORTS:
+        return jsonify({'success': False, 'error': 'Neplatné řazení'}), 400
+    order_by, keyset = MARKETPLACE_SORTS[sort]
+    limit = parse_limit(args.get('limit'), MARKETPLACE_PAGE_SIZE, MARKETPLACE_MAX_PAGE_SIZE)
+
+    where = ["m.status = 'active'", '(m.expires_at IS NULL OR m.expires_at > ?)']
+    params = [datetime.now(timezone.utc).isoformat()]
+    for arg, column in (('item', 'm.equipment_id'), ('slot', 'm.slot'),
+                        ('rarity', 'm.rarity'), ('currency', 'm.currency')):
+        if args.get(arg):
+            where.append(f'{column} = ?')
+            params.append(args[arg])
+    try:
+        if args.get('min_price'):
+            where.append('m.price >= ?')
+            params.append(float(args['min_price']))
+        if args.get('max_price'):
+            where.append('m.price <= ?')
+            params.append(float(args['max_price']))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Neplatná cena'}), 400
+    if args.get('cursor'):
+        try:
+            params.extend(decode_cursor(args['cursor'], keyset.count('?')))
+        except ValueError:
+            return jsonify({'success': False, 'error': 'Neplatný kurzor'}), 400
+        where.append(keyset)
+
+    conn = get_db()
+    c = conn.cursor()
+    c.execute(f'''SELECT m.id, m.seller_id, m.item_instance_id, m.equipment_id, m.slot, m.rarity,
+                         m.price, m.currency, m.created_at, u.username AS seller_name
+                  FROM item_marketplace m
+                  JOIN users u ON m.seller_id = u.id
+                  WHERE {' AND '.join(where)}
+                  ORDER BY {order_by}
+                  LIMIT ?''', (*params, limit + 1))
+    rows = c.fetchall()
+    conn.close()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([last['id']] if sort == 'newest' else [last['price'], last['id']])
+    items = catalog_payload('items')['items']
+    return jsonify({
+        'success': True,
+        'listings': [serialize_listing(row, items) for row in rows],
+        'next_cursor': next_cursor
+    })
+
+@bp.route('/api/marketplace/book/<equipment_id>', methods=['GET'])
+def get_marketplace_book(equipment_id):
+    """Price-sorted order book of one item with recent price history"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+
+    if equipment_id not in catalog_payload('items')['items']:
+        return jsonify({'success': False, 'error': 'Item nenalezen'}), 404
+    currency = request.args.get('currency', 'gooncoins')
+    depth = parse_limit(request.args.get('depth'), MARKETPLACE_BOOK_DEPTH, MARKETPLACE_MAX_PAGE_SIZE)
+    now_iso = datetime.now(timezone.utc).isoformat()
+
+    conn = get_db()
+    c = conn.cursor()
+    active = '''FROM item_marketplace
+                WHERE status = 'active' AND equipment_id = ? AND currency = ?
+                  AND (expires_at IS NULL OR expires_at > ?)'''
+    c.execute(f'SELECT price, COUNT(*) AS quantity {active} GROUP BY price ORDER BY price LIMIT ?',
+              (equipment_id, currency, now_iso, depth))
+    levels = [{'price': row['price'], 'quantity': row['quantity']} for row in c.fetchall()]
+    c.execute(f'SELECT COUNT(*) AS total {active}', (equipment_id, currency, now_iso))
+    total = c.fetchone()['total']
+
+    c.execute('''SELECT bucket, trades, volume, open_price, high_price, low_price, close_price
+                 FROM item_price_history
+                 WHERE item_id = ? AND currency = ?
+                 ORDER BY bucket DESC LIMIT ?''', (equipment_id, currency, MARKETPLACE_HISTORY_BUCKETS))
+    history = [dict(row) for row in reversed(c.fetchall())]
+
+    c.execute('''SELECT last_price, last_trend, last_trade_price, last_trade_at, trade_count
+                 FROM item_market_state WHERE item_id = ?''', (equipment_id,))
+    market = c.fetchone()
+    conn.close()
+
+    return jsonify({
+        'success': True,
+        'equipment_id': equipment_id,
+        'currency': currency,
+        'best_ask': levels[0]['price'] if levels else None,
+        'total_listings': total,
+        'levels': levels,
+        'history': history,
+        'market': dict(market) if market else None
+    })
+
+@bp.route('/api/marketplace/sell', methods=['POST'])
+def marketplace_sell():
+    """List an item for sale on marketplace"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+
+    data = request.get_json() or {}
+    instance_id = data.get('instance_id')
+    price = data.get('price')
+    currency = data.get('currency', 'gooncoins')
+
+    if not instance_id or not price:
+        return jsonify({'success': False, 'error': 'Chybí instance_id nebo price'}), 400
+
+    try:
+        price = float(price)
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'error': 'Neplatná cena'}), 400
+    if price <= 0:
+        return jsonify({'success': False, 'error': 'Cena musí být větší než 0'}), 400
+
+    user_id = session['user_id']
+    conn = get_db()
+    c = conn.cursor()
+
+    # Verify item exists and belongs to user
+    c.execute('SELECT * FROM equipment WHERE id = ? AND user_id = ?', (instance_id, user_id))
+    item = c.fetchone()
+    if not item:
+        conn.close()
+        return jsonify({'success': False, 'error': 'Item nenalezen'}), 404
+
+    # Check if item is equipped
+    if item['equipped']:
+        conn.close()
+        return jsonify({'success': False, 'error': 'Nelze prodat vybavený item'}), 400
+
+    # Check if already listed
+    c.execute("SELECT id FROM item_marketplace WHERE item_instance_id = ? AND status = 'active'", (instance_id,))
+    if c.fetchone():
+        conn.close()
+        return jsonify({'success': False, 'error': 'Item je již na trhu'}), 400
+
+    item_def = catalog_payload('items')['items'].get(item['equipment_id']) or {}
+    expires_at = (datetime.now(timezone.utc) + timedelta(days=MARKETPLACE_LISTING_DAYS)).isoformat()
+    c.execute('''INSERT INTO item_marketplace
+                 (seller_id, item_instance_id, equipment_id, slot, rarity, price, currency, status, expires_at)
+                 VALUES (?, ?, ?, ?, ?, ?, ?, 'active', ?)''',
+             (user_id, instance_id, item['equipment_id'], item_def.get('slot', item['equipment_slot']),
+              item_def.get('rarity', 'common'), price, currency, expires_at))
+
+    conn.commit()
+    conn.close()
+
+    return jsonify({
+        'success': True,
+        'message': 'Item přidán na trh'
+    })
+
+@bp.route('/api/marketplace/buy', methods=['POST'])
+def marketplace_buy():
+    """Buy an item from marketplace"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+
+    data = request.get_json() or {}
+    listing_id = data.get('listing_id')
+
+    if not listing_id:
+        return jsonify({'success': False, 'error': 'Chybí listing_id'}), 400
+
+    buyer_id = session['user_id']
+    now = datetime.now(timezone.utc)
+    conn = get_db()
+    c = conn.cursor()
+
+    # Get listing
+    c.execute('''SELECT m.*, e.equipment_id AS owned_equipment_id, e.user_id AS current_owner
+                 FROM item_marketplace m
+                 JOIN equipment e ON m.item_instance_id = e.id
+                 WHERE m.id = ? AND m.status = 'active' AND (m.expires_at IS NULL OR m.expires_at > ?)''',
+             (listing_id, now.isoformat()))
+    listing = c.fetchone()
+
+    if not listing:
+        conn.close()
+        return jsonify({'success': False, 'error': 'Nabídka nenalezena nebo již není aktivní'}), 404
+
+    if listing['seller_id'] == buyer_id:
+        conn.close()
+        return jsonify({'success': False, 'error': 'Nemůžeš koupit svůj vlastní item'}), 400
+
+    if listing['current_owner'] != listing['seller_id']:
+        conn.close()
+        return jsonify({'success': False, 'error': 'Item již nepatří prodejci'}), 400
+
+    # Get buyer resources
+    c.execute('SELECT * FROM game_state WHERE user_id = ?', (buyer_id,))
+    buyer_state = c.fetchone()
+    if not buyer_state:
+        conn.close()
+        return jsonify({'success': False, 'error': 'Game state nenalezen'}), 404
+
+    buyer_resources = extract_player_resources(buyer_state)
+    price = listing['price']
+    currency = listing['currency']
+
+    # Check if buyer has enough
+    if buyer_resources.get(currency, 0) < price:
+        conn.close()
+        return jsonify({'success': False, 'error': f'Nemáš dostatek {RESOURCE_LABELS_BACKEND.get(currency, currency)}'}), 400
+
+    # Claim the listing first so two concurrent buyers cannot both succeed
+    c.execute("""UPDATE item_marketplace SET status = 'sold', buyer_id = ?, closed_at = ?
+                 WHERE id = ? AND status = 'active'""", (buyer_id, now.isoformat(), listing_id))
+    if c.rowcount == 0:
+        conn.close()
+        return jsonify({'success': False, 'error': 'Nabídka nenalezena nebo již není aktivní'}), 404
+
+    # Transfer item
+    c.execute('UPDATE equipment SET user_id = ? WHERE id = ?', (buyer_id, listing['item_instance_id']))
+
+    # Transfer payment
+    buyer_resources[currency] = buyer_resources.get(currency, 0) - price
+    persist_resources(c, buyer_id, buyer_resources)
+
+    # Give money to seller
+    c.execute('SELECT * FROM game_state WHERE user_id = ?', (listing['seller_id'],))
+    seller_state = c.fetchone()
+    if seller_state:
+        seller_resources = extract_player_resources(seller_state)
+        seller_resources[currency] = seller_resources.get(currency, 0) + price
+        persist_resources(c, listing['seller_id'], seller_resources)
+
+    # Price history + item market state
+    record_item_trade(c, listing['equipment_id'] or listing['owned_equipment_id'], price, currency, now)
+
+    conn.commit()
+    conn.close()
+
+    refresh_economy_after_change()
+
+    return jsonify({
+        'success': True,
+        'message': 'Item zakoupen',
+        **resources_payload(buyer_resources)
+    })
+
+@bp.route('/api/marketplace/cancel', methods=['POST'])
+def marketplace_cancel():
+    """Cancel a marketplace listing"""
+    if 'user_id' not in session:
+        return jsonify({'success': False, 'error': 'Not authenticated'}), 401
+
+    data = request.get_json() or {}
+    listing_id = data.get('listing_id')
+
+    if not listing_id:
+        return jsonify({'success': False, 'error': 'Chybí listing_id'}), 400
+
+    user_id = session['user_id']
+    conn = get_db()
+    c = conn.cursor()
+
+    # Verify listing belongs to user
+    c.execute("SELECT * FROM item_marketplace WHERE id = ? AND seller_id = ? AND status = 'active'",
+             (listing_id, user_id))
+    listing = c.fetchone()
+
+    if not listing:
+        conn.close()
+        return jsonify({'success': False, 'error': 'Nabídka nenalezena'}), 404
+
+    # Cancel listing
+    c.execute("UPDATE item_marketplace SET status = 'cancelled', closed_at = ? WHERE id = ?",
+              (datetime.now(timezone.utc).isoformat(), listing_id))
+
+    conn.commit()
+    conn.close()
+
+    return jsonify({
+        'success': True,
+        'message': 'Nabídka zrušena'
+    })
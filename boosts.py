@@ -0,0 +1,116 @@
+import heapq
+import threading
+from datetime import datetime, timedelta, timezone
+
+# boost_type -> derived stat it multiplies
+BOOST_EFFECTS = {
+    'production': 'production',
+    'click_power': 'click_power',
+    'beer_strength': 'strength',
+    'beer_luck': 'luck',
+}
+BOOST_CACHE_SIZE = 4096
+
+
+def boost_expiry(duration, now=None):
+    """ISO expires_at for a boost lasting `duration` seconds (None = permanent).
+    Always UTC with second precision, so expires_at compares correctly as text."""
+    if not duration:
+        return None
+    now = now or datetime.now(timezone.utc)
+    return (now + timedelta(seconds=duration)).isoformat(timespec='seconds')
+
+
+def _expiry_timestamp(expires_at):
+    if not expires_at:
+        return None
+    try:
+        expires = datetime.fromisoformat(expires_at.replace('Z', '+00:00'))
+    except (TypeError, ValueError):
+        return None
+    if expires.tzinfo is None:
+        expires = expires.replace(tzinfo=timezone.utc)
+    return expires.timestamp()
+
+
+class ActiveBoosts:
+    """One user's live boosts plus their combined multiplier per effect"""
+    __slots__ = ('boosts', 'effects', 'next_expiry', 'lapsed')
+
+    def __init__(self, rows, now_ts):
+        self.boosts = []
+        self.effects = {}
+        self.next_expiry = None
+        self.lapsed = 0  # expired rows still in active_boosts
+        for row in rows:
+            expires_ts = _expiry_timestamp(row['expires_at'])
+            if expires_ts is not None and expires_ts <= now_ts:
+                self.lapsed += 1
+                continue
+            multiplier = row['multiplier'] or 1.0
+            self.boosts.append({
+                'type': row['boost_type'],
+                'multiplier': multiplier,
+                'expires_at': row['expires_at']
+            })
+            effect = BOOST_EFFECTS.get(row['boost_type'])
+            if effect:
+                self.effects[effect] = self.effects.get(effect, 1.0) * multiplier
+            if expires_ts is not None and (self.next_expiry is None or expires_ts < self.next_expiry):
+                self.next_expiry = expires_ts
+
+    def multiplier(self, effect):
+        return self.effects.get(effect, 1.0)
+
+
+class BoostBook:
+    """Per-process cache of ActiveBoosts keyed by user.
+
+    An entry is valid for one game_state.boosts_version (bumped whenever a boost
+    is granted) and until its earliest boost lapses. Lapses are tracked in a
+    min-heap of expiry times, so entries drop exactly when a multiplier changes
+    instead of on a TTL.
+    """
+
+    def __init__(self, maxsize=BOOST_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = {}  # user_id -> (version, ActiveBoosts)
+        self._heap = []  # (expiry timestamp, user_id)
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'expired': 0}
+
+    def _expire(self, now_ts):
+        """Drop entries whose earliest boost has lapsed"""
+        while self._heap and self._heap[0][0] <= now_ts:
+            expires_ts, user_id = heapq.heappop(self._heap)
+            entry = self._entries.get(user_id)
+            if entry and entry[1].next_expiry == expires_ts:
+                del self._entries[user_id]
+                self.stats['expired'] += 1
+
+    def get(self, user_id, version, now_ts):
+        """Cached ActiveBoosts for `version`, or None when it must be reloaded"""
+        with self._lock:
+            self._expire(now_ts)
+            entry = self._entries.get(user_id)
+            if entry and entry[0] == version:
+                self.stats['hits'] += 1
+                return entry[1]
+            self.stats['misses'] += 1
+            return None
+
+    def put(self, user_id, version, active):
+        with self._lock:
+            if len(self._entries) >= self.maxsize and user_id not in self._entries:
+                self._entries.clear()
+                self._heap = []
+            self._entries[user_id] = (version, active)
+            if active.next_expiry is not None:
+                heapq.heappush(self._heap, (active.next_expiry, user_id))
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def snapshot(self):
+        return {**self.stats, 'cached_users': len(self._entries), 'pending_expiries': len(self._heap)}
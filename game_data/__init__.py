@@ -0,0 +1,64 @@
+import hashlib
+import json
+import os
+import threading
+from collections.abc import Mapping
+
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class FrozenCatalog(Mapping):
+    """Read-only game data table loaded from game_data/<name>.json on first access"""
+
+    def __init__(self, name, key_type=str):
+        self.name = name
+        self.path = os.path.join(DATA_DIR, f'{name}.json')
+        self._key_type = key_type
+        self._data = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        data = self._data
+        if data is None:
+            with self._lock:
+                if self._data is None:
+                    with open(self.path, encoding='utf-8') as handle:
+                        raw = json.load(handle)
+                    if self._key_type is not str:
+                        raw = {self._key_type(key): value for key, value in raw.items()}
+                    self._data = raw
+                data = self._data
+        return data
+
+    @property
+    def loaded(self):
+        return self._data is not None
+
+    def content_hash(self):
+        """sha256 of the raw JSON file; does not load the table"""
+        with open(self.path, 'rb') as handle:
+            return hashlib.sha256(handle.read()).hexdigest()
+
+    def to_dict(self):
+        """Plain dict for jsonify (nested values are shared, treat them as read-only)"""
+        return dict(self._load())
+
+    def __getitem__(self, key):
+        return self._load()[key]
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __len__(self):
+        return len(self._load())
+
+    def __contains__(self, key):
+        return key in self._load()
+
+    def __repr__(self):
+        state = 'loaded' if self.loaded else 'lazy'
+        return f'<FrozenCatalog {self.name} ({state})>'
+
+
+def load_catalog(name, key_type=str):
+    return FrozenCatalog(name, key_type=key_type)
@@ -0,0 +1,110 @@
+import gzip
+import hashlib
+import json
+import threading
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+CATALOG_MAX_AGE = 31536000  # 1 year; URLs carry the content hash
+CATALOG_URL = '/api/catalog/{name}?v={etag}'
+
+
+class CatalogBlob:
+    """Static payload serialized once, with gzip/brotli variants and a content-hash ETag"""
+
+    __slots__ = ('name', 'payload', 'raw', 'gzip', 'br', 'etag')
+
+    def __init__(self, name, payload):
+        self.name = name
+        self.payload = payload
+        self.raw = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.etag = hashlib.sha256(self.raw).hexdigest()[:32]
+        self.gzip = gzip.compress(self.raw, compresslevel=9, mtime=0)
+        self.br = brotli.compress(self.raw, quality=11) if brotli else None
+
+    def pick_encoding(self, accept_encodings):
+        if self.br is not None and accept_encodings.quality('br') > 0:
+            return self.br, 'br'
+        if accept_encodings.quality('gzip') > 0:
+            return self.gzip, 'gzip'
+        return self.raw, None
+
+
+_builders = {}
+_blobs = {}
+_lock = threading.Lock()
+
+
+def register_catalog(name, builder):
+    """Register a zero-argument function returning the JSON-serializable static payload"""
+    with _lock:
+        _builders[name] = builder
+        _blobs.pop(name, None)
+
+
+def reset_catalogs():
+    """Drop built blobs (they are rebuilt on next request)"""
+    with _lock:
+        _blobs.clear()
+
+
+def get_catalog(name):
+    blob = _blobs.get(name)
+    if blob is None:
+        builder = _builders.get(name)
+        if builder is None:
+            return None
+        with _lock:
+            blob = _blobs.get(name)
+            if blob is None:
+                blob = CatalogBlob(name, builder())
+                _blobs[name] = blob
+    return blob
+
+
+def catalog_payload(name):
+    """Static payload object of a catalog, for endpoints that merge it with per-user data"""
+    blob = get_catalog(name)
+    return blob.payload if blob else None
+
+
+def catalog_manifest():
+    manifest = {}
+    for name in sorted(_builders):
+        blob = get_catalog(name)
+        manifest[name] = {
+            'etag': blob.etag,
+            'url': CATALOG_URL.format(name=name, etag=blob.etag),
+            'size': len(blob.raw)
+        }
+    return manifest
+
+
+def catalog_response(name):
+    """Serve a catalog blob with ETag/304 handling; None if the catalog is unknown.
+    Versioned URLs (?v=<etag>) are immutable, unversioned ones must revalidate."""
+    blob = get_catalog(name)
+    if blob is None:
+        return None
+
+    if request.args.get('v') == blob.etag:
+        cache_control = f'public, max-age={CATALOG_MAX_AGE}, immutable'
+    else:
+        cache_control = 'no-cache'
+
+    if request.if_none_match.contains(blob.etag):
+        response = Response(status=304)
+    else:
+        body, encoding = blob.pick_encoding(request.accept_encodings)
+        response = Response(body, mimetype='application/json')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(blob.etag)
+    response.headers['Cache-Control'] = cache_control
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
@@ -0,0 +1,224 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+import traceback
+
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE_SIZE = 256
+JOURNAL_PATH = 'lugog_jobs.db'
+
+
+def _process_alive(pid):
+    if pid <= 0 or os.name == 'nt':  # os.kill(pid, 0) would terminate the process on Windows
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobQueue:
+    """In-process runner for post-commit work (economy refresh and similar).
+
+    Jobs are identified by (name, key); submitting a job that is already
+    pending is a no-op, so a burst of requests triggers one refresh.
+    Pending jobs are journaled to a local SQLite file and replayed on start,
+    so work accepted before a restart is not lost. Journal rows belong to the
+    pid that wrote them; a starting process only replays its own rows and
+    those it claims from processes that have exited.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, maxsize=DEFAULT_QUEUE_SIZE, journal_path=JOURNAL_PATH, synchronous=False):
+        self.workers = workers
+        self.maxsize = maxsize
+        self.journal_path = journal_path
+        self.synchronous = synchronous
+        self._handlers = {}
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._queue = None
+        self._journal_ops = None
+        self._pid = None
+        self.stats = {'submitted': 0, 'coalesced': 0, 'completed': 0, 'failed': 0, 'inline': 0}
+
+    def register(self, name, func):
+        """Register handler `func(*args)` for jobs named `name`"""
+        self._handlers[name] = func
+
+    def job(self, name):
+        def decorator(func):
+            self.register(name, func)
+            return func
+        return decorator
+
+    # ----- journal -----
+
+    def _journal(self):
+        conn = sqlite3.connect(self.journal_path, timeout=5.0)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    def _claim_journal(self):
+        """Take over rows left by exited processes (and by an earlier process
+        with this pid); returns this process's rows to replay"""
+        conn = self._journal()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute('''CREATE TABLE IF NOT EXISTS job_journal
+                            (owner INTEGER NOT NULL,
+                             name TEXT NOT NULL,
+                             job_key TEXT NOT NULL,
+                             args TEXT NOT NULL DEFAULT '[]',
+                             enqueued_at REAL NOT NULL,
+                             PRIMARY KEY (owner, name, job_key))''')
+            try:
+                # Journal files from before per-process ownership: owner 0 is never alive
+                conn.execute('''INSERT OR IGNORE INTO job_journal (owner, name, job_key, args, enqueued_at)
+                                SELECT 0, name, job_key, args, enqueued_at FROM pending_jobs''')
+                conn.execute('DROP TABLE pending_jobs')
+            except sqlite3.OperationalError:
+                pass
+            owners = [row[0] for row in conn.execute('SELECT DISTINCT owner FROM job_journal')]
+            for owner in owners:
+                if owner == self._pid or _process_alive(owner):
+                    continue
+                # Rows this process already journals win; the rest move over
+                conn.execute('UPDATE OR IGNORE job_journal SET owner = ? WHERE owner = ?', (self._pid, owner))
+                conn.execute('DELETE FROM job_journal WHERE owner = ?', (owner,))
+            rows = conn.execute('SELECT name, job_key, args FROM job_journal WHERE owner = ? ORDER BY enqueued_at',
+                                (self._pid,)).fetchall()
+            conn.commit()
+            return rows
+        finally:
+            conn.close()
+
+    def _write_journal(self):
+        """Journal writer thread: applies queued adds/removes in batches, one
+        transaction per batch, so submit() and workers never wait on disk"""
+        conn = None
+        while True:
+            ops = [self._journal_ops.get()]
+            while True:
+                try:
+                    ops.append(self._journal_ops.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if conn is None:
+                    conn = self._journal()
+                with conn:
+                    for op, name, key, args in ops:
+                        if op == 'add':
+                            conn.execute('''INSERT OR IGNORE INTO job_journal (owner, name, job_key, args, enqueued_at)
+                                            VALUES (?, ?, ?, ?, ?)''',
+                                         (self._pid, name, key, json.dumps(args), time.time()))
+                        else:
+                            conn.execute('DELETE FROM job_journal WHERE owner = ? AND name = ? AND job_key = ?',
+                                         (self._pid, name, key))
+            except sqlite3.Error:
+                pass  # journal is best-effort; the jobs still run in-process
+            for _ in ops:
+                self._journal_ops.task_done()
+
+    # ----- workers -----
+
+    def _ensure_started(self):
+        # gunicorn forks after import; threads don't survive the fork
+        if self._queue is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._queue is not None and self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.maxsize)
+            self._journal_ops = queue.Queue()
+            self._pid = os.getpid()
+            self._pending = set()
+            for index in range(self.workers):
+                threading.Thread(target=self._work, name=f'job-worker-{index}', daemon=True).start()
+            threading.Thread(target=self._write_journal, name='job-journal', daemon=True).start()
+            self._replay()
+
+    def _replay(self):
+        """Re-queue jobs journaled by this pid or claimed from exited processes"""
+        try:
+            rows = self._claim_journal()
+        except sqlite3.Error:
+            return
+        for name, key, args in rows:
+            if name in self._handlers and (name, key) not in self._pending:
+                self._pending.add((name, key))
+                try:
+                    self._queue.put_nowait((name, key, json.loads(args)))
+                except queue.Full:
+                    self._pending.discard((name, key))
+                    break
+
+    def _run(self, name, key, args):
+        try:
+            self._handlers[name](*args)
+            self.stats['completed'] += 1
+        except Exception:
+            self.stats['failed'] += 1
+            traceback.print_exc()
+
+    def _work(self):
+        while True:
+            name, key, args = self._queue.get()
+            with self._lock:
+                # a submit arriving while this job runs queues a fresh one
+                self._pending.discard((name, key))
+            self._run(name, key, args)
+            with self._lock:
+                # Checked and queued under the lock so a concurrent submit's add lands after this remove
+                if (name, key) not in self._pending:
+                    self._journal_ops.put(('remove', name, key, None))
+            self._queue.task_done()
+
+    def submit(self, name, *args, key=''):
+        """Queue job `name(*args)`; duplicates of a pending (name, key) coalesce.
+        Runs inline when the queue is full (back-pressure) or in synchronous mode."""
+        self.stats['submitted'] += 1
+        if self.synchronous:
+            self._run(name, key, args)
+            return True
+        self._ensure_started()
+        with self._lock:
+            if (name, key) in self._pending:
+                self.stats['coalesced'] += 1
+                return False
+            try:
+                self._queue.put_nowait((name, key, args))
+                self._pending.add((name, key))
+                self._journal_ops.put(('add', name, key, list(args)))
+                return True
+            except queue.Full:
+                pass
+        self.stats['inline'] += 1
+        self._run(name, key, args)
+        return True
+
+    def drain(self, timeout=None):
+        """Wait until queued jobs are done and journaled (CLI commands, shutdown)"""
+        if self._queue is None or self._pid != os.getpid():
+            return
+        deadline = time.monotonic() + timeout if timeout else None
+        while self._queue.unfinished_tasks or self._journal_ops.unfinished_tasks:
+            if deadline and time.monotonic() > deadline:
+                return
+            time.sleep(0.01)
+
+    def snapshot(self):
+        return {
+            **self.stats,
+            'pending': len(self._pending),
+            'queued': self._queue.qsize() if self._queue is not None else 0,
+            'journal_backlog': self._journal_ops.qsize() if self._journal_ops is not None else 0,
+            'workers': self.workers
+        }
@@ -0,0 +1,61 @@
+import bisect
+import threading
+
+EXP_BASE = 100
+EXP_EXPONENT = 1.5
+POINTS_PER_LEVEL = 5
+EXP_TABLE_LEVELS = 2000  # precomputed up front; grown on demand beyond that
+
+# CUMULATIVE_EXP[i] = experience needed to get from level 1 to level i + 1
+CUMULATIVE_EXP = [0.0]
+_table_lock = threading.Lock()
+
+
+def exp_for_level(level):
+    """Experience needed to go from `level` to `level + 1`"""
+    return EXP_BASE * (level ** EXP_EXPONENT)
+
+
+def _extend_table(max_level):
+    with _table_lock:
+        total = CUMULATIVE_EXP[-1]
+        for level in range(len(CUMULATIVE_EXP), max_level + 1):
+            total += exp_for_level(level)
+            CUMULATIVE_EXP.append(total)
+
+
+_extend_table(EXP_TABLE_LEVELS)
+
+
+def total_exp(level, experience):
+    """Lifetime experience of a character at `level` with `experience` into it"""
+    if level > len(CUMULATIVE_EXP):
+        _extend_table(level)
+    return CUMULATIVE_EXP[level - 1] + experience
+
+
+def level_for_total_exp(total):
+    """(level, experience into that level) for a lifetime experience total"""
+    while total >= CUMULATIVE_EXP[-1]:
+        _extend_table(len(CUMULATIVE_EXP) * 2)
+    index = bisect.bisect_right(CUMULATIVE_EXP, total) - 1
+    return index + 1, total - CUMULATIVE_EXP[index]
+
+
+def grant_experience(level, experience, gained):
+    """Add `gained` experience; returns dict with new level/experience,
+    levels gained and skill points awarded (POINTS_PER_LEVEL per level)"""
+    level = max(1, int(level or 1))
+    experience = experience or 0
+    new_level, new_experience = level_for_total_exp(total_exp(level, experience) + (gained or 0))
+    if new_level < level:
+        # stored experience was already below the level floor; never de-level
+        new_level, new_experience = level, experience + (gained or 0)
+    levels_gained = new_level - level
+    return {
+        'level': new_level,
+        'experience': new_experience,
+        'levels_gained': levels_gained,
+        'points_awarded': levels_gained * POINTS_PER_LEVEL,
+        'experience_needed': exp_for_level(new_level)
+    }
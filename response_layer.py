@@ -0,0 +1,136 @@
+import gzip
+
+from flask import current_app, request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional, stdlib json is used as fallback
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is always available
+    brotli = None
+
+COMPRESS_MIN_SIZE = 1024  # bytes; smaller bodies are not worth the CPU
+COMPRESS_LEVEL = 6
+BROTLI_QUALITY = 5
+JSON_FLOAT_DIGITS = None  # opt-in: round every float in every response to N places (costs a full copy)
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/html', 'text/plain'}
+
+
+def round_floats(value, digits):
+    """Recursively round floats so payloads don't carry 17-digit float noise"""
+    if isinstance(value, float):
+        return round(value, digits)
+    if isinstance(value, dict):
+        return {key: round_floats(item, digits) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [round_floats(item, digits) for item in value]
+    return value
+
+
+class GameJSONProvider(DefaultJSONProvider):
+    """jsonify() backend: orjson when installed, no pretty-printing.
+    Payload builders round their own floats; JSON_FLOAT_DIGITS adds a
+    recursive pre-pass over whole responses only when set."""
+
+    compact = True
+
+    def _prepare(self, obj):
+        digits = self._app.config.get('JSON_FLOAT_DIGITS', JSON_FLOAT_DIGITS)
+        if digits is None:
+            return obj
+        return round_floats(obj, digits)
+
+    def _orjson_dumps(self, obj):
+        options = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(self._prepare(obj), default=self.default, option=options)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return self._orjson_dumps(obj).decode('utf-8')
+        return super().dumps(self._prepare(obj), **kwargs)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._orjson_dumps(obj), mimetype=self.mimetype)
+
+
+def wants_columnar():
+    """Client opted into the columnar encoding (?columnar=1 or X-Columnar: 1)"""
+    return request.args.get('columnar') == '1' or request.headers.get('X-Columnar') == '1'
+
+
+def to_columnar(rows, key_column=None):
+    """[{a: 1, b: 2}, ...] -> {'columns': [a, b], 'rows': [[1, 2], ...]}.
+    A dict of dicts is encoded with its keys in `key_column`."""
+    if isinstance(rows, dict):
+        key_column = key_column or 'id'
+        rows = [{key_column: key, **value} for key, value in rows.items()]
+    columns = []
+    seen = set()
+    for row in rows:
+        for key in row:
+            if key not in seen:
+                seen.add(key)
+                columns.append(key)
+    return {
+        'columns': columns,
+        'rows': [[row.get(column) for column in columns] for row in rows]
+    }
+
+
+def encode_inventory(inventory_payload):
+    """Columnar variant of build_inventory_payload() output when the client asked for it"""
+    if not wants_columnar():
+        return inventory_payload
+    encoded = dict(inventory_payload)
+    encoded['items'] = to_columnar(inventory_payload['items'])
+    encoded['market'] = to_columnar(inventory_payload['market'], key_column='item_id')
+    encoded['encoding'] = 'columnar'
+    return encoded
+
+
+def compress_response(response):
+    """after_request hook: gzip/brotli large uncompressed responses the client accepts"""
+    if (response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    min_size = current_app.config.get('COMPRESS_MIN_SIZE', COMPRESS_MIN_SIZE)
+    if response.content_length is not None and response.content_length < min_size:
+        return response
+
+    accept = request.accept_encodings
+    if brotli is not None and accept.quality('br') > 0:
+        encoding = 'br'
+    elif accept.quality('gzip') > 0:
+        encoding = 'gzip'
+    else:
+        return response
+
+    body = response.get_data()
+    if len(body) < min_size:
+        return response
+    if encoding == 'br':
+        compressed = brotli.compress(body, quality=BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(body, compresslevel=COMPRESS_LEVEL)
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    response.headers['Content-Length'] = str(len(compressed))
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_response_layer(app):
+    app.json = GameJSONProvider(app)
+    app.after_request(compress_response)
@@ -18,7 +18,9 @@ document.addEventListener('DOMContentLoaded', () => {
     
     const state = {
         users: [],
-        filter: ''
+        filter: '',
+        searchResults: [],
+        searchTimer: null
     };
     
     const numberFormatter = new Intl.NumberFormat('cs-CZ');
@@ -73,13 +75,30 @@ document.addEventListener('DOMContentLoaded', () => {
         `).join('');
     };
     
-    const applyFilter = () => {
-        if (!state.filter) {
-            return state.users;
+    // The overview lists only the richest players; name searches go to the server index
+    const applyFilter = () => (state.filter ? state.searchResults : state.users);
+    
+    const searchUsers = async () => {
+        const query = state.filter;
+        if (!query) {
+            renderTable(applyFilter());
+            return;
+        }
+        try {
+            const response = await fetch(`/api/admin/users/search?q=${encodeURIComponent(query)}`);
+            if (!response.ok) {
+                const errorPayload = await response.json().catch(() => ({}));
+                throw new Error(errorPayload.error || 'Vyhledávání selhalo');
+            }
+            const data = await response.json();
+            if (query !== state.filter) {
+                return;  // a newer query is on its way
+            }
+            state.searchResults = data.users || [];
+            renderTable(applyFilter());
+        } catch (error) {
+            setMessage(error.message, 'error');
         }
-        return state.users.filter((user) =>
-            user.username.toLowerCase().includes(state.filter)
-        );
     };
     
     const renderTable = (users) => {
@@ -160,6 +179,7 @@ document.addEventListener('DOMContentLoaded', () => {
             }
             await response.json();
             await fetchOverview();
+            await searchUsers();
             setMessage('Změna byla uložena.', 'success');
         } catch (error) {
             setMessage(error.message, 'error');
@@ -169,7 +189,12 @@ document.addEventListener('DOMContentLoaded', () => {
     if (adminSearchInput) {
         adminSearchInput.addEventListener('input', (event) => {
             state.filter = event.target.value.trim().toLowerCase();
-            renderTable(applyFilter());
+            clearTimeout(state.searchTimer);
+            if (!state.filter) {
+                renderTable(applyFilter());
+                return;
+            }
+            state.searchTimer = setTimeout(searchUsers, 250);
         });
     }
     
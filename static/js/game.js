@@ -677,20 +677,54 @@ async function initGame() {
     updateDisplay();
 }
 
+// Static catalogs (shop, cases, story, items, pets, seeds, dungeons) change only
+// with a deploy; /api/catalog lists content-hash URLs the browser caches forever.
+let catalogManifestPromise = null;
+const catalogCache = {};
+
+async function fetchCatalog(name) {
+    if (catalogCache[name]) {
+        return catalogCache[name];
+    }
+    if (!catalogManifestPromise) {
+        catalogManifestPromise = fetch('/api/catalog').then(response => response.json());
+    }
+    let manifest;
+    try {
+        manifest = await catalogManifestPromise;
+    } catch (error) {
+        catalogManifestPromise = null;
+        throw error;
+    }
+    const entry = manifest.catalogs && manifest.catalogs[name];
+    if (!entry) {
+        throw new Error(`Katalog ${name} není dostupný`);
+    }
+    const response = await fetch(entry.url);
+    if (!response.ok) {
+        throw new Error(`Katalog ${name} se nepodařilo načíst`);
+    }
+    catalogCache[name] = await response.json();
+    return catalogCache[name];
+}
+
 // Load story data
 async function loadStoryData() {
     try {
-        const response = await fetch('/api/story-data');
-        if (response.ok) {
-            const data = await response.json();
-            storyData = data.chapters;
-            equipmentDefs = data.equipment;
-            buildingsDefs = data.buildings;
-            if (data.gems) {
-                gemsDefs = data.gems;
-            }
-            storyEquipmentCounts = data.equipment_counts || {};
-            loreEntries = data.lore_entries || [];
+        const [catalog, countsResponse] = await Promise.all([
+            fetchCatalog('story'),
+            fetch('/api/story-data/counts')
+        ]);
+        storyData = catalog.chapters;
+        equipmentDefs = catalog.equipment;
+        buildingsDefs = catalog.buildings;
+        if (catalog.gems) {
+            gemsDefs = catalog.gems;
+        }
+        loreEntries = catalog.lore_entries || [];
+        if (countsResponse.ok) {
+            const counts = await countsResponse.json();
+            storyEquipmentCounts = counts.equipment_counts || {};
         }
     } catch (error) {
         console.error('Error loading story data:', error);
@@ -1467,13 +1501,16 @@ async function loadCases() {
     const list = document.getElementById('caseList');
     if (!list) return;
     try {
-        const response = await fetch('/api/cases');
-        if (!response.ok) {
+        const [catalog, historyResponse] = await Promise.all([
+            fetchCatalog('cases'),
+            fetch('/api/cases/history')
+        ]);
+        if (!historyResponse.ok) {
             list.innerHTML = '<p class="muted">Bedny se nepodařilo načíst.</p>';
             return;
         }
-        const data = await response.json();
-        caseDefinitions = data.cases || [];
+        const data = await historyResponse.json();
+        caseDefinitions = catalog.cases || [];
         caseDefinitionMap = {};
         caseDefinitions.forEach(def => {
             caseDefinitionMap[def.id] = def;
@@ -2344,13 +2381,17 @@ function renderCombatLogs(logs = []) {
             ? 'Kampaň'
             : log.mode === 'temple'
                 ? 'Chrám'
-                : 'PvP';
+                : log.mode === 'dungeon'
+                    ? 'Dungeon'
+                    : 'PvP';
         const monsterName = log.summary?.monster ? getMonsterNameById(log.summary.monster) : null;
         let opponentName;
         if (log.mode === 'campaign') {
             opponentName = monsterName || 'Monstrum';
         } else if (log.mode === 'temple') {
             opponentName = log.summary?.enemy_name || 'Chrám';
+        } else if (log.mode === 'dungeon') {
+            opponentName = log.summary?.enemy_name || 'Dungeon';
         } else {
             opponentName = log.attacker?.username === currentUsername
                 ? (log.defender?.username || '???')
@@ -2490,6 +2531,11 @@ function setupTempleSection() {
             const button = event.target.closest('.temple-fight-btn');
             if (button && button.dataset.room) {
                 handleTempleFight(button.dataset.room);
+                return;
+            }
+            const grindButton = event.target.closest('.temple-grind-btn');
+            if (grindButton && grindButton.dataset.room) {
+                handleTempleGrind(grindButton.dataset.room);
             }
         });
     }
@@ -2644,6 +2690,10 @@ function renderTempleRooms(rooms = []) {
                 <button class="btn-green temple-fight-btn" data-room="${room.id}" ${disabled ? 'disabled' : ''}>
                     ${buttonLabel}
                 </button>
+                ${room.unlocked && !room.boss_ready ? `
+                <button class="btn-blue temple-grind-btn" data-room="${room.id}" ${disabled ? 'disabled' : ''}>
+                    Bojovat až k bossovi
+                </button>` : ''}
             </div>
         `;
     }).join('');
@@ -2767,6 +2817,48 @@ async function handleTempleFight(roomId) {
     }
 }
 
+async function handleTempleGrind(roomId) {
+    setCombatMessage('Chrámové souboje se připravují...', false);
+    try {
+        const response = await fetch('/api/temple/grind', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ room_id: roomId })
+        });
+        const data = await response.json();
+        if (!response.ok || !data.success) {
+            setCombatMessage(data.error || 'Chrám tě odmítl.', true);
+            if (typeof data.cooldown_seconds === 'number') {
+                updateTempleCooldown(data.cooldown_seconds);
+            }
+            return;
+        }
+        if (typeof data.gooncoins === 'number') {
+            gameState.gooncoins = data.gooncoins;
+            updateResourcesOnly();
+        }
+        if (data.temple) {
+            templeSnapshot = data.temple;
+            gameState.temple = data.temple;
+            renderTempleSection();
+        } else {
+            await loadTempleStatus();
+        }
+        await loadCombatOverview();
+        const rewardText = formatTempleRewards(data.rewards || {});
+        let message = `Vyhráno ${data.wins}/${data.fights.length} soubojů. ${rewardText}`;
+        if (!data.player_won) {
+            message += ' Chrám tě srazil na kolena.';
+        } else if (data.boss_ready) {
+            message += ' Boss je připraven!';
+        }
+        setCombatMessage(message, !data.player_won);
+    } catch (error) {
+        console.error('Temple grind failed:', error);
+        setCombatMessage('Chrámové souboje se nepodařilo odehrát.', true);
+    }
+}
+
 async function handleTempleRitual(blessingId) {
     setCombatMessage('Chrám žehná...', false);
     try {
@@ -3047,7 +3139,7 @@ const DISPLAY_UPDATE_THROTTLE = 200; // Only update display max 5 times per seco
 
 async function loadGameState() {
     try {
-        const response = await fetch('/api/game-state');
+        const response = await fetch('/api/game-state?columnar=1');
         if (response.ok) {
             const data = await response.json();
             applyResourcePayload(data);
@@ -3622,10 +3714,13 @@ let currentShopCategory = 'all';
 
 async function loadShop() {
     try {
-        const response = await fetch('/api/shop');
+        const [catalog, response] = await Promise.all([
+            fetchCatalog('shop'),
+            fetch('/api/shop/state')
+        ]);
         if (response.ok) {
             const data = await response.json();
-            shopData = data;
+            shopData = { items: catalog.items || [], gems: data.gems || 0 };
             renderShop();
             updateGemsDisplay();
         }
@@ -4626,11 +4721,37 @@ function loadEquipment() {
     // This function is kept for compatibility but does nothing
 }
 
+// Columnar tables ({columns, rows}) are sent for ?columnar=1 requests
+function decodeColumnar(table) {
+    if (!table || !Array.isArray(table.columns) || !Array.isArray(table.rows)) {
+        return [];
+    }
+    return table.rows.map(row => {
+        const entry = {};
+        table.columns.forEach((column, index) => {
+            if (row[index] !== null && row[index] !== undefined) {
+                entry[column] = row[index];
+            }
+        });
+        return entry;
+    });
+}
+
 function normalizeInventoryPayload(payload = {}) {
+    let items = payload.items;
+    let market = payload.market || {};
+    if (payload.encoding === 'columnar') {
+        items = decodeColumnar(payload.items);
+        market = {};
+        decodeColumnar(payload.market).forEach(entry => {
+            market[entry.item_id] = entry;
+        });
+    }
     return {
-        items: Array.isArray(payload.items) ? payload.items : [],
+        items: Array.isArray(items) ? items : [],
+        fruits: payload.fruits || {},
         summary: payload.summary || {},
-        market: payload.market || {},
+        market: market,
         updated_at: payload.updated_at || null
     };
 }
@@ -4890,7 +5011,7 @@ function setInventoryMessage(message, isError = false) {
 async function refreshInventoryMarket() {
     try {
         setInventoryMessage('Aktualizuji inventář...', false);
-        const response = await fetch('/api/inventory');
+        const response = await fetch('/api/inventory?columnar=1');
         const data = await response.json();
         if (!response.ok || !data.success) {
             setInventoryMessage(data.error || 'Inventář se nepodařilo načíst.', true);
@@ -5362,16 +5483,19 @@ function setupCharacterPanelEvents() {
     });
     
     document.querySelectorAll('.stat-upgrade-btn').forEach(btn => {
-        btn.addEventListener('click', async () => {
+        btn.title = 'Shift+klik: vložit všechny body';
+        btn.addEventListener('click', async (event) => {
             const stat = btn.dataset.stat;
             if (!stat) return;
+            // Shift-click spends every available point in one request
+            const amount = event.shiftKey ? Math.max(1, characterStats.available_points || 0) : 1;
             
             btn.disabled = true;
             try {
                 const response = await fetch('/api/character-stats/upgrade', {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ stat })
+                    body: JSON.stringify({ stat, amount })
                 });
                 
                 const data = await response.json();
@@ -5401,13 +5525,14 @@ function setupCharacterPanelEvents() {
         exchangeAmountEl.style.display = 'none'; // Hide input field
     }
     
-    // Continuous exchange state
-    let exchangeInterval = null;
+    // Hold-to-exchange: points accumulate locally while the button is held,
+    // the server converts them in a single request on release
+    const POINT_PRICE = 1000;
+    let exchangeTimer = null;
     let exchangeStartTime = null;
-    let isExchanging = false;
-    let totalPointsExchanged = 0;
-    let totalGooncoinsUsed = 0;
-    let exchangeIsRunning = false;
+    let lastTickTime = null;
+    let pendingPoints = 0;
+    let maxAffordablePoints = 0;
     
     // Speed calculation: starts at 1x, increases gradually
     function getSpeedMultiplier(secondsHeld) {
@@ -5415,25 +5540,19 @@ function setupCharacterPanelEvents() {
         return Math.min(1.0 + (secondsHeld / 2) * 0.1, 5.0);
     }
     
-    async function performExchange(speedMultiplier) {
-        if (isExchanging) return; // Prevent overlapping requests
-        if ((gameState.gooncoins || 0) < 1000) {
-            stopExchange();
-            setExchangeMessage('Nemáš dostatek Gooncoinů pro směnu', true);
-            return;
-        }
-        
-        isExchanging = true;
-        const baseAmount = 1000; // Base exchange amount per cycle
-        
+    function renderPendingExchange(speed) {
+        const btn = document.getElementById('exchangePointsBtn');
+        if (!btn) return;
+        const points = Math.floor(pendingPoints);
+        btn.textContent = `Pusť pro směnu: ${points} bod(ů) (${speed.toFixed(1)}x rychlost)`;
+    }
+    
+    async function submitExchange(points) {
         try {
             const response = await fetch('/api/character-stats/exchange-points', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ 
-                    gooncoins: baseAmount,
-                    speed_multiplier: speedMultiplier
-                })
+                body: JSON.stringify({ points })
             });
             
             const data = await response.json();
@@ -5441,101 +5560,70 @@ function setupCharacterPanelEvents() {
             if (data.success) {
                 characterStats.available_points = data.available_points;
                 gameState.gooncoins = data.gooncoins_remaining;
-                totalPointsExchanged += data.points_gained;
-                totalGooncoinsUsed += data.gooncoins_used;
                 updateCharacterPanel();
                 updateResourcesOnly();
-                
-                // Update button text with speed info
-                const secondsHeld = (Date.now() - exchangeStartTime) / 1000;
-                const speed = getSpeedMultiplier(secondsHeld);
-                exchangeBtn.textContent = `Drž pro směnu (${speed.toFixed(1)}x rychlost)`;
+                setExchangeMessage(
+                    `Získal jsi ${data.points_gained} bod(ů) za ${formatNumber(data.gooncoins_used)} Gooncoinů!`,
+                    false
+                );
             } else {
-                if (data.error && !data.error.includes('dostatek')) {
-                    setExchangeMessage(data.error, true);
-                }
-                stopExchange();
+                setExchangeMessage(data.error || 'Chyba při směně', true);
             }
         } catch (error) {
             console.error('Error exchanging points:', error);
-            stopExchange();
             setExchangeMessage('Chyba při směně: ' + error.message, true);
-        } finally {
-            isExchanging = false;
         }
     }
     
+    function exchangeTick() {
+        const now = Date.now();
+        const speed = getSpeedMultiplier((now - exchangeStartTime) / 1000);
+        // At 1x speed: 2 points/s, at 5x speed: 10 points/s
+        pendingPoints = Math.min(maxAffordablePoints, pendingPoints + (now - lastTickTime) / 1000 * 2 * speed);
+        lastTickTime = now;
+        renderPendingExchange(speed);
+    }
+    
     function startExchange() {
-        if (exchangeInterval) return; // Already running
+        if (exchangeTimer) return; // Already running
         
-        if ((gameState.gooncoins || 0) < 1000) {
-            setExchangeMessage('Nemáš dostatek Gooncoinů. Potřebuješ alespoň 1000', true);
+        maxAffordablePoints = Math.floor((gameState.gooncoins || 0) / POINT_PRICE);
+        if (maxAffordablePoints < 1) {
+            setExchangeMessage(`Nemáš dostatek Gooncoinů. Potřebuješ alespoň ${POINT_PRICE}`, true);
             return;
         }
         
         exchangeStartTime = Date.now();
-        totalPointsExchanged = 0;
-        totalGooncoinsUsed = 0;
-        exchangeBtn.classList.add('exchanging');
-        setExchangeMessage('Drž tlačítko pro kontinuální směnu...', false);
-        
-        let lastExchangeTime = Date.now();
-        exchangeIsRunning = true;
-        
-        function exchangeLoop() {
-            if (!exchangeIsRunning) return; // Stopped
-            
-            const now = Date.now();
-            const secondsHeld = (now - exchangeStartTime) / 1000;
-            const speedMultiplier = getSpeedMultiplier(secondsHeld);
-            
-            // Calculate interval based on speed (faster = shorter interval)
-            // At 1x speed: 500ms, at 5x speed: 100ms
-            const targetInterval = Math.max(100, 500 / speedMultiplier);
-            
-            if (now - lastExchangeTime >= targetInterval) {
-                performExchange(speedMultiplier);
-                lastExchangeTime = now;
-            }
-            
-            // Update button text with current speed
-            if (exchangeBtn && exchangeIsRunning) {
-                const speed = getSpeedMultiplier(secondsHeld);
-                exchangeBtn.textContent = `Drž pro směnu (${speed.toFixed(1)}x rychlost)`;
-            }
-            
-            if (exchangeIsRunning) {
-                exchangeInterval = setTimeout(exchangeLoop, 50); // Check every 50ms
-            }
-        }
-        
-        // Start the loop
-        exchangeInterval = setTimeout(exchangeLoop, 0);
-        
-        // Also do immediate first exchange
-        performExchange(1.0);
+        lastTickTime = exchangeStartTime;
+        pendingPoints = 1; // a short click exchanges one point
+        const btn = document.getElementById('exchangePointsBtn');
+        if (btn) btn.classList.add('exchanging');
+        setExchangeMessage('Drž tlačítko, pusť pro směnu...', false);
+        renderPendingExchange(1.0);
+        exchangeTimer = setInterval(exchangeTick, 100);
     }
     
     function stopExchange() {
-        exchangeIsRunning = false;
-        if (exchangeInterval) {
-            clearTimeout(exchangeInterval);
-            exchangeInterval = null;
-        }
-        exchangeStartTime = null;
-        if (exchangeBtn) {
-            exchangeBtn.classList.remove('exchanging');
-            exchangeBtn.textContent = 'Drž pro směnu';
+        if (!exchangeTimer) return;
+        clearInterval(exchangeTimer);
+        exchangeTimer = null;
+        const points = Math.floor(pendingPoints);
+        pendingPoints = 0;
+        const btn = document.getElementById('exchangePointsBtn');
+        if (btn) {
+            btn.classList.remove('exchanging');
+            btn.textContent = 'Drž pro směnu';
         }
-        
-        if (totalPointsExchanged > 0) {
-            setExchangeMessage(
-                `Získal jsi ${totalPointsExchanged} bod(ů) za ${formatNumber(totalGooncoinsUsed)} Gooncoinů!`, 
-                false
-            );
+        if (points > 0) {
+            submitExchange(points);
         }
     }
     
+    const exchangeMaxBtn = document.getElementById('exchangeMaxBtn');
+    if (exchangeMaxBtn) {
+        exchangeMaxBtn.onclick = () => submitExchange('max');
+    }
+    
     if (exchangeBtn) {
         // Remove old click listener by cloning
         const newBtn = exchangeBtn.cloneNode(true);
@@ -6843,10 +6931,22 @@ let selectedFloor = 1;
 
 async function loadDungeons() {
     try {
-        const response = await fetch('/api/dungeons/list');
+        const [catalog, response] = await Promise.all([
+            fetchCatalog('dungeons'),
+            fetch('/api/dungeons/progress')
+        ]);
         const data = await response.json();
         
         if (data.success) {
+            // Merge static definitions with per-user progress
+            const progressById = data.progress || {};
+            data.dungeons = (catalog.dungeons || []).map(dungeon => ({
+                ...dungeon,
+                unlocked: false,
+                current_floor: 1,
+                completed_floors: [],
+                ...(progressById[dungeon.id] || {})
+            }));
             allDungeons = data.dungeons;
             const dungeonsListEl = document.getElementById('dungeonsList');
             if (dungeonsListEl) {
@@ -7319,6 +7419,71 @@ async function dungeonFight() {
     }
 }
 
+// Clears floors from the selected one upwards in a single request, stopping at the first defeat
+async function dungeonSweep() {
+    if (!selectedDungeon) {
+        showCustomAlert('Vyber dungeon', { type: 'warning' });
+        return;
+    }
+    const dungeon = allDungeons.find(d => d.id === selectedDungeon);
+    if (!dungeon) return;
+    
+    const sweepBtn = document.getElementById('dungeonSweepBtn');
+    if (sweepBtn) {
+        sweepBtn.disabled = true;
+        sweepBtn.textContent = 'Bojuji...';
+    }
+    
+    try {
+        const response = await fetch('/api/dungeons/sweep', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({
+                dungeon_id: selectedDungeon,
+                from_floor: selectedFloor || dungeon.current_floor || 1,
+                to_floor: dungeon.max_floor
+            })
+        });
+        const data = await response.json();
+        
+        if (data.success) {
+            const lastFloor = data.floors[data.floors.length - 1];
+            let message = `Vyčištěno pater: ${data.cleared}`;
+            if (data.stopped_at) {
+                message += `\nProhra na patře ${data.stopped_at} (${lastFloor.enemy_name})`;
+            }
+            if (data.rewards && data.rewards.items && data.rewards.items.length) {
+                message += `\n🎁 Předměty: ${data.rewards.items.join(', ')}`;
+            }
+            showCustomAlert(message, {
+                type: data.cleared > 0 ? 'success' : 'warning',
+                rewards: {
+                    gooncoins: data.rewards?.gooncoins,
+                    exp: data.rewards?.exp
+                },
+                levelUp: data.levels_gained > 0 ? data.new_level : null
+            });
+            
+            selectedFloor = data.current_floor;
+            await loadDungeons();
+            if (typeof loadCharacterPanel === 'function') {
+                loadCharacterPanel();
+            }
+            selectDungeon(selectedDungeon);
+        } else {
+            showCustomAlert(data.error || 'Chyba při boji', { type: 'error' });
+        }
+    } catch (error) {
+        console.error('Error sweeping dungeon:', error);
+        showCustomAlert('Chyba při boji: ' + (error.message || 'Neznámá chyba'), { type: 'error' });
+    } finally {
+        if (sweepBtn) {
+            sweepBtn.disabled = false;
+            sweepBtn.textContent = 'Projít patra';
+        }
+    }
+}
+
 // ========== GUILD SYSTEM ==========
 
 async function loadGuilds() {
@@ -7326,6 +7491,7 @@ async function loadGuilds() {
         // Load my guild
         const myGuildResponse = await fetch('/api/guilds/my');
         const myGuildData = await myGuildResponse.json();
+        const myGuild = myGuildData.success ? myGuildData.guild : null;
         
         if (myGuildData.success) {
             const myGuildEl = document.getElementById('myGuildDisplay');
@@ -7342,7 +7508,9 @@ async function loadGuilds() {
                         <ul>
                             ${guild.members.map(m => `<li>${m.username} (${m.role})</li>`).join('')}
                         </ul>
+                        <div id="guildWarDisplay"></div>
                     `;
+                    loadGuildWar();
                 } else {
                     myGuildEl.innerHTML = '<p class="muted">Nejsi v žádné guildě</p>';
                 }
@@ -7363,7 +7531,10 @@ async function loadGuilds() {
                         <p>Členů: ${guild.member_count}</p>
                         <p>EXP bonus: +${(guild.exp_bonus * 100).toFixed(1)}%</p>
                         <p>Gold bonus: +${(guild.gold_bonus * 100).toFixed(1)}%</p>
+                        ${guild.at_war ? '<p>⚔️ Ve válce</p>' : ''}
                         <button class="btn-blue" onclick="joinGuild(${guild.id})">Připojit se</button>
+                        ${myGuild && myGuild.role === 'leader' && myGuild.id !== guild.id && !guild.at_war && !myGuild.active_war_id
+                            ? `<button class="btn-blue" onclick="declareGuildWar(${guild.id})">Vyhlásit válku</button>` : ''}
                     </div>
                 `).join('');
             }
@@ -7373,6 +7544,51 @@ async function loadGuilds() {
     }
 }
 
+async function loadGuildWar() {
+    const warEl = document.getElementById('guildWarDisplay');
+    if (!warEl) return;
+    try {
+        const response = await fetch('/api/guilds/war');
+        const data = await response.json();
+        if (!data.success || !data.war) {
+            warEl.innerHTML = '';
+            return;
+        }
+        const war = data.war;
+        const title = war.status === 'active'
+            ? `⚔️ Válka do ${new Date(war.ends_at).toLocaleString()}`
+            : `Poslední válka: ${war.winner_id ? 'vítěz ' + (war.sides.find(s => s.guild_id === war.winner_id) || {}).name : 'remíza'}`;
+        warEl.innerHTML = `
+            <h5>${title}</h5>
+            <ul>
+                ${war.sides.map(side => `<li>${side.name}: ${Math.floor(side.points)} bodů (PvP ${side.pvp_wins}, dungeony ${side.dungeon_clears}, ${formatNumber(side.gooncoins_earned)} 💰)</li>`).join('')}
+            </ul>
+        `;
+    } catch (error) {
+        console.error('Error loading guild war:', error);
+    }
+}
+
+async function declareGuildWar(guildId) {
+    try {
+        const response = await fetch('/api/guilds/war/declare', {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({guild_id: guildId})
+        });
+        const data = await response.json();
+        
+        if (data.success) {
+            loadGuilds();
+        } else {
+            alert(data.error || 'Chyba při vyhlašování války');
+        }
+    } catch (error) {
+        console.error('Error declaring guild war:', error);
+        alert('Chyba při vyhlašování války');
+    }
+}
+
 async function createGuild() {
     const name = document.getElementById('guildNameInput').value;
     const description = document.getElementById('guildDescInput').value;
@@ -7488,6 +7704,10 @@ function initNewSystems() {
     if (dungeonFightBtn) {
         dungeonFightBtn.addEventListener('click', dungeonFight);
     }
+    const dungeonSweepBtn = document.getElementById('dungeonSweepBtn');
+    if (dungeonSweepBtn) {
+        dungeonSweepBtn.addEventListener('click', dungeonSweep);
+    }
     
     // Make selectFloor available globally
     window.selectFloor = selectFloor;
@@ -7509,12 +7729,15 @@ function initNewSystems() {
 // Pets functions
 async function loadPets() {
     try {
-        const response = await fetch('/api/pets');
+        const [catalog, response] = await Promise.all([
+            fetchCatalog('pets'),
+            fetch('/api/pets/mine')
+        ]);
         const data = await response.json();
         
         if (data.success) {
             displayMyPets(data.pets || []);
-            displayAvailablePets(data.available_pets || [], data.pets || []);
+            displayAvailablePets(catalog.available_pets || [], data.pets || []);
         } else {
             console.error('Error loading pets:', data.error);
         }
@@ -7743,37 +7966,23 @@ function loadPetFruits(petId, requiredRarity) {
     const container = document.getElementById(`pet-feed-list-${petId}`);
     if (!container) return;
     
-    // Get user's fruits from inventory
-    const inventory = gameState.inventory?.items || [];
-    const fruits = inventory.filter(item => item.item_type === 'fruit' || item.equipment_slot === 'fruit');
-    
-    // Filter fruits by rarity (must be required rarity or better)
+    // Fruit stacks from inventory, filtered by rarity (must be required rarity or better)
     const rarityOrder = {'common': 1, 'rare': 2, 'epic': 3, 'legendary': 4, 'unique': 5};
     const requiredRarityOrder = rarityOrder[requiredRarity] || 1;
-    const availableFruits = fruits.filter(fruit => {
-        const fruitRarity = fruit.rarity || 'common';
-        return (rarityOrder[fruitRarity] || 1) >= requiredRarityOrder;
+    const fruitCounts = Object.entries(gameState.inventory?.fruits || {}).filter(([fruitId, count]) => {
+        const fruitRarity = getFruitDef(fruitId)?.rarity || 'common';
+        return count > 0 && (rarityOrder[fruitRarity] || 1) >= requiredRarityOrder;
     });
     
-    if (availableFruits.length === 0) {
+    if (fruitCounts.length === 0) {
         container.innerHTML = `<p class="muted">Nemáš žádné ${requiredRarity} ovoce nebo lepší!</p>`;
         return;
     }
     
-    // Group fruits by type and count
-    const fruitCounts = {};
-    availableFruits.forEach(fruit => {
-        const fruitId = fruit.equipment_id;
-        if (!fruitCounts[fruitId]) {
-            fruitCounts[fruitId] = 0;
-        }
-        fruitCounts[fruitId]++;
-    });
-    
     container.innerHTML = `
         <div class="pet-feed-title">Vyber ovoce pro krmení:</div>
         <div class="pet-feed-fruits-grid">
-            ${Object.entries(fruitCounts).map(([fruitId, count]) => {
+            ${fruitCounts.map(([fruitId, count]) => {
                 const fruitDef = getFruitDef(fruitId);
                 return `
                     <button class="pet-feed-fruit-btn" onclick="feedPet(${petId}, '${fruitId}')">
@@ -7781,6 +7990,9 @@ function loadPetFruits(petId, requiredRarity) {
                         <span class="pet-feed-fruit-name">${fruitDef?.name || fruitId}</span>
                         <span class="pet-feed-fruit-count">x${count}</span>
                     </button>
+                    <button class="pet-feed-fruit-btn" onclick="feedPet(${petId}, '${fruitId}', 'max')">
+                        <span class="pet-feed-fruit-name">Do maxima</span>
+                    </button>
                 `;
             }).join('')}
         </div>
@@ -7876,13 +8088,16 @@ async function loadGarden() {
     
     gardenLoadingInProgress = true;
     try {
-        const response = await fetch('/api/garden');
+        const [catalog, response] = await Promise.all([
+            fetchCatalog('seeds'),
+            fetch('/api/garden/state')
+        ]);
         const data = await response.json();
         
         if (data.success) {
             gardenFruitsCache = data.fruits || {};
             displayGardenPlots(data.plots || []);
-            displayGardenShop(data.available_seeds || []);
+            displayGardenShop(catalog.available_seeds || []);
         } else {
             console.error('Error loading garden:', data.error);
             // Clear loading messages even on error
@@ -7910,7 +8125,12 @@ function displayGardenPlots(plots) {
         return;
     }
     
-    container.innerHTML = plots.map(plot => {
+    const readyCount = plots.filter(plot => plot.is_ready).length;
+    const harvestAllButton = readyCount > 1
+        ? `<div class="garden-bulk-actions"><button class="btn-green btn-small" onclick="harvestAllPlots()">Sklidit vše (${readyCount})</button></div>`
+        : '';
+    
+    container.innerHTML = harvestAllButton + plots.map(plot => {
         const timeRemaining = plot.time_remaining || 0;
         const hours = Math.floor(timeRemaining / 3600);
         const minutes = Math.floor((timeRemaining % 3600) / 60);
@@ -7984,6 +8204,7 @@ function displayGardenShop(seeds) {
                 <div class="seed-cost">Cena: ${costText}</div>
                 <div class="seed-actions">
                     <button class="btn-blue btn-small" onclick="buySeed('${seed.seed_id}')">Koupit & Zasít</button>
+                    <button class="btn-blue btn-small" onclick="buySeed('${seed.seed_id}', 5)">Zasít 5×</button>
                 </div>
             </div>
         `;
@@ -8017,7 +8238,7 @@ function displayGardenFruits(fruits) {
 
 async function loadGardenFruits() {
     try {
-        const response = await fetch('/api/garden');
+        const response = await fetch('/api/garden/state');
         const data = await response.json();
         if (data.success) {
             gardenFruitsCache = data.fruits || {};
@@ -8029,12 +8250,12 @@ async function loadGardenFruits() {
     return {};
 }
 
-async function buySeed(seedId) {
+async function buySeed(seedId, count = 1) {
     try {
-        const response = await fetch('/api/garden/buy-seed', {
+        const response = await fetch(count > 1 ? '/api/garden/plant' : '/api/garden/buy-seed', {
             method: 'POST',
             headers: {'Content-Type': 'application/json'},
-            body: JSON.stringify({seed_id: seedId})
+            body: JSON.stringify({seed_id: seedId, count})
         });
         const data = await response.json();
         
@@ -8073,12 +8294,30 @@ async function harvestPlot(plotId) {
     }
 }
 
-async function feedPet(petId, fruitId) {
+async function harvestAllPlots() {
+    try {
+        const response = await fetch('/api/garden/harvest-all', {method: 'POST'});
+        const data = await response.json();
+        
+        if (data.success) {
+            showGardenMessage(data.message || 'Sklizeno!', 'success');
+            loadGarden();
+            loadPets();
+        } else {
+            showGardenMessage(data.error || 'Chyba při sklizni', 'error');
+        }
+    } catch (error) {
+        console.error('Error harvesting plots:', error);
+        showGardenMessage('Chyba při sklizni', 'error');
+    }
+}
+
+async function feedPet(petId, fruitId, count = 1) {
     try {
         const response = await fetch('/api/pets/feed', {
             method: 'POST',
             headers: {'Content-Type': 'application/json'},
-            body: JSON.stringify({pet_id: petId, fruit_id: fruitId})
+            body: JSON.stringify({pet_id: petId, fruit_id: fruitId, count})
         });
         const data = await response.json();
         
@@ -8111,6 +8350,7 @@ function showGardenMessage(message, type) {
 // Make functions globally available
 window.buySeed = buySeed;
 window.harvestPlot = harvestPlot;
+window.harvestAllPlots = harvestAllPlots;
 window.feedPet = feedPet;
 
 // Initialize on page load
@@ -0,0 +1,91 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+# ========== SQLITE ==========
+
+class SQLiteBackend:
+    """One sqlite3 connection per get_db() call, WAL journal, Row factory"""
+
+    name = 'sqlite'
+
+    def __init__(self, path, timeout=20.0):
+        self.path = path
+        self.timeout = timeout
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, timeout=self.timeout)
+        conn.row_factory = sqlite3.Row
+        # Enable WAL mode for better concurrent access
+        conn.execute('PRAGMA journal_mode=WAL')
+        return conn
+
+    def close(self):
+        pass
+
+    def __repr__(self):
+        return f'<SQLiteBackend {self.path}>'
+
+
+# ========== CONFIGURATION ==========
+
+def create_backend(url):
+    """sqlite:///path/to.db; other databases plug in as further backends
+    exposing name, exists(), connect() and close()"""
+    if url.startswith('sqlite:///'):
+        return SQLiteBackend(url[len('sqlite:///'):])
+    raise ValueError(f'Unsupported database URL: {url}')
+
+
+def benchmark_writes(backend, threads=8, seconds=5.0):
+    """Concurrent single-row write transactions against `backend`.
+    Returns dict with commits, errors (e.g. 'database is locked') and commits/s."""
+    conn = backend.connect()
+    conn.execute('CREATE TABLE IF NOT EXISTS storage_bench (worker INTEGER PRIMARY KEY, writes INTEGER NOT NULL DEFAULT 0)')
+    for worker in range(threads):
+        conn.execute('INSERT OR IGNORE INTO storage_bench (worker, writes) VALUES (?, 0)', (worker,))
+    conn.commit()
+    conn.close()
+
+    results = [[0, 0] for _ in range(threads)]
+    deadline = time.perf_counter() + seconds
+
+    def run(worker):
+        while time.perf_counter() < deadline:
+            conn = backend.connect()
+            try:
+                conn.execute('UPDATE storage_bench SET writes = writes + 1 WHERE worker = ?', (worker,))
+                conn.commit()
+                results[worker][0] += 1
+            except sqlite3.OperationalError:
+                results[worker][1] += 1
+            finally:
+                conn.close()
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=run, args=(worker,)) for worker in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    conn = backend.connect()
+    conn.execute('DROP TABLE storage_bench')
+    conn.commit()
+    conn.close()
+
+    commits = sum(result[0] for result in results)
+    return {
+        'backend': backend.name,
+        'threads': threads,
+        'seconds': round(elapsed, 2),
+        'commits': commits,
+        'errors': sum(result[1] for result in results),
+        'commits_per_second': round(commits / elapsed, 1) if elapsed else 0.0
+    }
@@ -0,0 +1,98 @@
+STORY_KINDS = ('quest', 'building', 'currency')
+
+
+def encode_mask(mask):
+    """Mask as stored in the story_progress *_bits TEXT columns: lowercase hex,
+    any length, so the number of quests/buildings/currencies is unbounded"""
+    return format(mask, 'x')
+
+
+def decode_mask(value):
+    """Stored mask -> int. Accepts hex text, legacy INTEGER masks and NULL."""
+    if value is None or value == '':
+        return 0
+    if isinstance(value, int):
+        return value
+    return int(value, 16)
+
+
+def story_names(chapters, buildings_defs, legacy_currencies=()):
+    """Every name that needs a bit, per kind, in catalog order"""
+    names = {kind: [] for kind in STORY_KINDS}
+    for chapter in sorted(chapters):
+        for quest in chapters[chapter].get('quests', []):
+            names['quest'].append(quest['id'])
+            for unlock in quest.get('unlocks', []):
+                if unlock not in legacy_currencies:
+                    names['building'].append(unlock)
+    names['currency'].append('gooncoins')
+    for building_type, definition in buildings_defs.items():
+        names['building'].append(building_type)
+        names['currency'].extend(definition.get('unlock_currencies', []))
+    return {kind: list(dict.fromkeys(values)) for kind, values in names.items()}
+
+
+def assign_story_bits(existing, names):
+    """New (kind, name, bit) rows for names without a bit. Bits are append-only,
+    so stored masks stay valid when quests are added or reordered."""
+    new_rows = []
+    for kind, values in names.items():
+        used = {bit for (row_kind, _), bit in existing.items() if row_kind == kind}
+        next_bit = max(used) + 1 if used else 0
+        for name in values:
+            if (kind, name) in existing:
+                continue
+            new_rows.append((kind, name, next_bit))
+            next_bit += 1
+    return new_rows
+
+
+class StoryIndex:
+    """Quest lookup and bit assignments for story_progress masks.
+
+    bits maps (kind, name) -> bit. Quests are indexed by id with their chapter,
+    and each chapter has a precomputed mask of its required (non-optional) quests,
+    so completion checks are a single AND. Stored masks may be passed as read
+    from the database (see decode_mask).
+    """
+
+    def __init__(self, chapters, bits):
+        self.bits = bits
+        self._names = {kind: {} for kind in STORY_KINDS}
+        for (kind, name), bit in bits.items():
+            self._names.setdefault(kind, {})[bit] = name
+        self.quests = {}  # quest_id -> (chapter, quest, bit)
+        self.chapter_required = {}  # chapter -> mask of required quests
+        for chapter, data in chapters.items():
+            required = 0
+            for quest in data.get('quests', []):
+                bit = bits[('quest', quest['id'])]
+                self.quests[quest['id']] = (chapter, quest, bit)
+                if not quest.get('optional'):
+                    required |= 1 << bit
+            if data.get('quests'):
+                self.chapter_required[chapter] = required
+
+    def mask(self, kind, names):
+        mask = 0
+        for name in names:
+            bit = self.bits.get((kind, name))
+            if bit is not None:
+                mask |= 1 << bit
+        return mask
+
+    def names(self, kind, mask):
+        """Names whose bits are set in `mask`, in bit order"""
+        mask = decode_mask(mask)
+        return [name for bit, name in sorted(self._names[kind].items()) if mask >> bit & 1]
+
+    def has(self, kind, mask, name):
+        bit = self.bits.get((kind, name))
+        return bit is not None and bool(decode_mask(mask) >> bit & 1)
+
+    def chapter_complete(self, chapter, quests_mask):
+        """True when every required quest of `chapter` is in `quests_mask`"""
+        if chapter not in self.chapter_required:
+            return False
+        required = self.chapter_required[chapter]
+        return decode_mask(quests_mask) & required == required
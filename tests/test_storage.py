@@ -0,0 +1,72 @@
+"""storage.py: backend selection and the SQLite backend behind get_db()."""
+import sqlite3
+
+import pytest
+
+from storage import SQLiteBackend, benchmark_writes, create_backend
+
+
+@pytest.fixture
+def backend(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'storage_test.db'))
+    conn = backend.connect()
+    conn.execute('''CREATE TABLE storage_test_items
+                    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                     name TEXT NOT NULL UNIQUE,
+                     amount INTEGER NOT NULL DEFAULT 0)''')
+    conn.commit()
+    conn.close()
+    yield backend
+    backend.close()
+
+
+def test_create_backend_selects_sqlite(tmp_path):
+    backend = create_backend(f'sqlite:///{tmp_path / "app.db"}')
+    assert backend.name == 'sqlite'
+    assert backend.path == str(tmp_path / 'app.db')
+    assert not backend.exists()
+
+
+def test_create_backend_rejects_unknown_urls():
+    with pytest.raises(ValueError):
+        create_backend('postgresql://localhost/lugog')
+
+
+def test_connections_use_wal_and_row_factory(backend):
+    conn = backend.connect()
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    conn.execute('INSERT INTO storage_test_items (name, amount) VALUES (?, ?)', ('gold', 5))
+    row = conn.execute('SELECT name, amount FROM storage_test_items').fetchone()
+    assert (row['name'], row['amount']) == ('gold', 5)
+    conn.close()
+
+
+def test_close_discards_uncommitted_work(backend):
+    conn = backend.connect()
+    conn.execute('INSERT INTO storage_test_items (name) VALUES (?)', ('committed',))
+    conn.commit()
+    conn.execute('INSERT INTO storage_test_items (name) VALUES (?)', ('dropped',))
+    conn.close()
+    conn = backend.connect()
+    assert [row['name'] for row in conn.execute('SELECT name FROM storage_test_items').fetchall()] == ['committed']
+    conn.close()
+
+
+def test_on_conflict_relative_update(backend):
+    conn = backend.connect()
+    for amount in (3, 4):
+        conn.execute('''INSERT INTO storage_test_items (name, amount) VALUES (?, ?)
+                        ON CONFLICT(name) DO UPDATE SET amount = amount + excluded.amount''', ('metal', amount))
+    assert conn.execute('SELECT amount FROM storage_test_items').fetchone()['amount'] == 7
+    with pytest.raises(sqlite3.IntegrityError):
+        conn.execute('INSERT INTO storage_test_items (name) VALUES (?)', ('metal',))
+    conn.close()
+
+
+def test_benchmark_writes_cleans_up(backend):
+    result = benchmark_writes(backend, threads=2, seconds=0.2)
+    assert result['backend'] == 'sqlite'
+    assert result['commits'] > 0
+    conn = backend.connect()
+    assert conn.execute("SELECT name FROM sqlite_master WHERE name = 'storage_bench'").fetchone() is None
+    conn.close()
@@ -0,0 +1,76 @@
+import threading
+import time
+from collections import OrderedDict
+
+USER_SEARCH_CACHE_SIZE = 256
+USER_SEARCH_CACHE_TTL = 30  # seconds; other workers' registrations show up after this
+TRIGRAM_MIN_LENGTH = 3  # FTS5 trigram MATCH needs at least one full trigram
+
+
+def fold_username(username):
+    """Case-folded form stored in users.username_folded. Folding happens in
+    Python only, so stored names and queries can never disagree (SQLite's
+    lower() leaves non-ASCII letters such as "Č" untouched)."""
+    return (username or '').casefold()
+
+
+def normalize_query(query):
+    return fold_username(' '.join((query or '').split()))
+
+
+def like_pattern(query):
+    """LIKE pattern (ESCAPE '\\') matching `query` anywhere in the name"""
+    escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f'%{escaped}%'
+
+
+def fts_phrase(query):
+    """Query text as a quoted FTS5 phrase (substring match under the trigram tokenizer)"""
+    return '"' + query.replace('"', '""') + '"'
+
+
+def prefix_bounds(query):
+    """(low, high) range on username_folded that covers every name starting with `query`"""
+    return query, query + '\U0010ffff'
+
+
+class UsernameQueryCache:
+    """Per-worker LRU of recent username searches.
+
+    Keys are normalized queries, values the ranked candidate rows. Entries
+    expire after `ttl` seconds; registrations in this worker clear the cache.
+    """
+
+    def __init__(self, maxsize=USER_SEARCH_CACHE_SIZE, ttl=USER_SEARCH_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (stored_at, rows)
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0}
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and now - entry[0] < self.ttl:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return entry[1]
+            if entry:
+                del self._entries[key]
+            self.stats['misses'] += 1
+            return None
+
+    def put(self, key, rows):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), rows)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def snapshot(self):
+        return {**self.stats, 'cached_queries': len(self._entries)}